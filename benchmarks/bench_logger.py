@@ -0,0 +1,246 @@
+'''Benchmark of the logging pipeline
+
+Measure the producer-side latency of the Logger calls and the end-to-end
+# of records handled per second, for the process and thread handlers,
+the synchronous toolboxTom.logger.logger.Logger and the disabled levels.
+
+Usage
+-----
+From the root of the repository, or without PYTHONPATH once the package
+is installed with pip install -e .
+
+PYTHONPATH=. python benchmarks/bench_logger.py -o bench.json
+PYTHONPATH=. python benchmarks/bench_logger.py -o new.json \
+    --compare bench.json
+
+The results are written as JSON. With --compare, the cases whose mean
+latency or throughput regressed by more than --tolerance are reported
+and the exit code is 1.
+'''
+import os
+import sys
+import json
+import logging
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from time import perf_counter, strftime
+from contextlib import contextmanager
+
+from toolboxTom.logger import Logger
+from toolboxTom.logger.logger import Logger as SyncLogger
+
+SIZES = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+
+@contextmanager
+def quiet():
+    '''Send the output of this process and its children to /dev/null'''
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def time_calls(call, n):
+    '''Return the total time and the per-call times (in s) of n calls'''
+    times = np.empty(n)
+    t_start = perf_counter()
+    for i in range(n):
+        t0 = perf_counter()
+        call(i)
+        times[i] = perf_counter() - t0
+    return perf_counter() - t_start, times
+
+
+def result(backend, op, n, t_prod, t_total, times, size=None):
+    return dict(backend=backend, op=op, size=size, n=n,
+                mean_us=1e6*t_prod/n,
+                p50_us=1e6*float(np.percentile(times, 50)),
+                p99_us=1e6*float(np.percentile(times, 99)),
+                records_per_s=n/t_total)
+
+
+def n_calls(size, n):
+    '''Less calls for the big arrays, to copy about 256MB'''
+    return int(max(10, min(n, 2.5e8 // (8*size))))
+
+
+def bench_async(backend, n, graph_dir):
+    '''Benchmark the asynchronous Logger with the given backend
+
+    The handler keeps all the logged objects, so each size of log_obj
+    runs with a fresh handler, stopped after it to free its objects.
+    '''
+    res = []
+    Logger.configure(backend=backend, graph_dir=graph_dir, graph_save=1e9)
+
+    def run(log, op, call, n, size=None):
+        t_start = perf_counter()
+        t_prod, times = time_calls(lambda i: call(log, i), n)
+        # The handler treats the records in order, so its reply comes
+        # after all of them are handled
+        log.get_metrics(timeout=600)
+        t_total = perf_counter() - t_start
+        res.append(result(backend, op, n, t_prod, t_total, times, size))
+
+    def session(cases):
+        log = Logger('bench', levl=logging.DEBUG)
+        try:
+            # Start the handler before measuring
+            log.info('start')
+            log.get_metrics()
+            for case in cases:
+                run(log, *case)
+        finally:
+            log.end()
+
+    try:
+        session([
+            ('info', lambda log, i: log.info('record', i), n),
+            ('progress', lambda log, i: log.progress(
+                iteration=i+1, i_max=n, name='bench'), n),
+            ('graphical_cost', lambda log, i: log.graphical_cost(
+                name='bench', cost=1/(i+1), iteration=i+1), n)])
+        for size in SIZES:
+            x = np.random.random(size)
+            session([('log_obj', lambda log, i: log.log_obj(
+                name='x{}'.format(size), obj=x, iteration=i),
+                n_calls(size, n), size)])
+    finally:
+        Logger.configure(backend='process')
+        Logger.handler_params.clear()
+    return res
+
+
+def bench_sync(n):
+    '''Benchmark the synchronous Logger of toolboxTom.logger.logger'''
+    res = []
+    log = SyncLogger(levl=logging.DEBUG, name='bench_sync')
+    for op, call in [
+            ('info', lambda i: log.info('record {}'.format(i))),
+            ('progress', lambda i: log.progress('bench', i, n))]:
+        t_prod, times = time_calls(call, n)
+        res.append(result('sync', op, n, t_prod, t_prod, times))
+    return res
+
+
+def bench_disabled(n):
+    '''Benchmark the calls below the level of the Logger'''
+    res = []
+    log = Logger('bench_disabled', levl=logging.CRITICAL)
+    x = np.random.random(1000)
+
+    def span(i):
+        with log.span('bench'):
+            pass
+
+    try:
+        for op, call in [
+                ('info', lambda i: log.info('record', i)),
+                ('progress', lambda i: log.progress(iteration=i, i_max=n)),
+                ('graphical_cost', lambda i: log.graphical_cost(cost=i)),
+                ('log_obj', lambda i: log.log_obj(name='x', obj=x)),
+                ('span', span)]:
+            t_prod, times = time_calls(call, n)
+            res.append(result('disabled', op, n, t_prod, t_prod, times))
+    finally:
+        log.end()
+    return res
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance=.2):
+    '''Return the cases of results which regressed compared to baseline
+    '''
+    key = lambda r: (r['backend'], r['op'], r['size'])
+    old = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results['results']:
+        o = old.get(key(r))
+        if o is None:
+            continue
+        if (r['mean_us'] > (1+tolerance)*o['mean_us'] or
+                r['records_per_s'] < o['records_per_s']/(1+tolerance)):
+            regressions.append((r, o))
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the logging pipeline')
+    parser.add_argument('-o', '--output', default='bench_logger.json',
+                        help='JSON file for the results')
+    parser.add_argument('-n', type=int, default=10000,
+                        help='# of calls for each case')
+    parser.add_argument('--backend', nargs='+',
+                        default=['process', 'thread', 'sync', 'disabled'],
+                        help='benchmarked backends')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help='relative slow down reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as graph_dir:
+        for backend in args.backend:
+            sys.stderr.write('Benchmark {}\n'.format(backend))
+            with quiet():
+                if backend == 'sync':
+                    results += bench_sync(args.n)
+                elif backend == 'disabled':
+                    results += bench_disabled(args.n)
+                else:
+                    results += bench_async(backend, args.n, graph_dir)
+
+    results = dict(meta=dict(date=strftime('%Y-%m-%d %H:%M:%S'),
+                             commit=git_commit(), n=args.n,
+                             python=platform.python_version(),
+                             numpy=np.__version__,
+                             platform=platform.platform()),
+                   results=results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print('{:>9} {:>15} {:>9} {:>10} {:>10} {:>10} {:>12}'.format(
+        'backend', 'op', 'size', 'mean(us)', 'p50(us)', 'p99(us)',
+        'records/s'))
+    for r in results['results']:
+        print('{backend:>9} {op:>15} {size!s:>9} {mean_us:10.2f} '
+              '{p50_us:10.2f} {p99_us:10.2f} {records_per_s:12.0f}'
+              ''.format(**r))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for r, o in regressions:
+            print('REGRESSION {backend} {op} {size}: {mean:.2f}us -> '
+                  '{r_mean:.2f}us, {rps:.0f} -> {r_rps:.0f} records/s'
+                  ''.format(mean=o['mean_us'], r_mean=r['mean_us'],
+                            rps=o['records_per_s'],
+                            r_rps=r['records_per_s'], **r))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
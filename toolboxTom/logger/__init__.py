@@ -9,6 +9,10 @@ MODE = 6
 OBJ = 7
 LEVEL = 8
 FAIL = 9
+BATCH = 10
+GET = 11
+SPAN = 12
+METRICS = 13
 
 # Activate debugging output for the logger
 DEBUG = False
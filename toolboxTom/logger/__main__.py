@@ -0,0 +1,4 @@
+# Replay a trace file: python -m toolboxTom.logger run.trace --graph-dir out
+from .trace import main
+
+main()
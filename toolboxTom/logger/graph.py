@@ -0,0 +1,77 @@
+import numpy as np
+
+from .store import Column
+
+
+def decimate(x, y, n_points=2000):
+    '''Min/max decimation of the curve (x, y) to about n_points points
+
+    The points are split in n_points/2 buckets of consecutive points and
+    only the min and the max of each bucket are kept, so the extrema of
+    the curve are still displayed.
+
+    Parameters
+    ----------
+    x, y: coordinates of the points, sorted by x
+    n_points: max # of points returned
+    '''
+    n = len(x)
+    if n <= n_points:
+        return x, y
+    size = -(-2*n // n_points)
+    m = (n // size) * size
+    offset = np.arange(0, m, size)
+    yb = y[:m].reshape(-1, size)
+    idx = [offset + yb.argmin(axis=1), offset + yb.argmax(axis=1),
+           [0, n-1]]
+    if m < n:
+        idx += [[m + np.argmin(y[m:]), m + np.argmax(y[m:])]]
+    idx = np.unique(np.concatenate(idx))
+    return x[idx], y[idx]
+
+
+class Curve(object):
+    """Points of a graphical_cost curve
+
+    The points are appended in amortised O(1) and only sorted and
+    decimated when the curve is displayed.
+
+    Parameters
+    ----------
+    n_points: max # of points displayed
+    """
+    def __init__(self, n_points=2000):
+        self.n_points = n_points
+        self.x = Column()
+        self.y = Column()
+        self.sorted = True
+        self.x_last = 0
+        self.bounds = [np.inf, -np.inf, np.inf, -np.inf]
+
+    def __len__(self):
+        return len(self.x)
+
+    def append(self, x, y):
+        if len(self.x) > 0 and x < self.x_last:
+            self.sorted = False
+        self.x.append(float(x))
+        self.y.append(float(y))
+        self.x_last = x
+        b = self.bounds
+        self.bounds = [min(b[0], x), max(b[1], x), min(b[2], y), max(b[3], y)]
+
+    def inside(self, xlim, ylim):
+        '''Return True if all the points are inside the given limits'''
+        x0, x1, y0, y1 = self.bounds
+        return (min(xlim) <= x0 and x1 <= max(xlim) and
+                min(ylim) <= y0 and y1 <= max(ylim))
+
+    def display(self):
+        '''Return the decimated points of the curve, sorted by x'''
+        x, y = self.x.values(), self.y.values()
+        if not self.sorted:
+            i0 = np.argsort(x, kind='stable')
+            x[:], y[:] = x[i0], y[i0]
+            self.sorted = True
+            self.x_last = x[-1]
+        return decimate(x, y, self.n_points)
@@ -1,40 +1,81 @@
+import os
 from sys import stdout as out
 import numpy as np
 import logging
-from multiprocessing import Process, Manager, Queue
+from multiprocessing import Process, Queue
+from threading import Thread
+import queue
 from queue import Empty
-from collections import defaultdict
-from time import time
+from collections import defaultdict, deque
+from time import time, monotonic
 
-import matplotlib as mpl
-mpl.interactive(True)
 
-
-from . import STOP, PROGRESS, SAVE, COST, LOG, PASS, OBJ, LEVEL
+from . import STOP, PROGRESS, SAVE, COST, LOG, PASS, OBJ, LEVEL, BATCH, GET
+from . import SPAN, METRICS
 from . import DEBUG
+from .shared_array import SharedArray
+from .store import TrajectoryStore
+from .graph import Curve
+from .trace import TraceWriter
+from .span import chrome_trace
+from .metrics import HandlerMetrics
+from .progress import ProgressRenderer
 
 
-class Handler(Process):
-    """Asynchronous logging handler
+class BaseHandler(object):
+    """Asynchronous logging handler loop, run by Handler or ThreadHandler
 
     Usage
     -----
     Insert logging entry in h.get_pin() with shape (a, l, kwargs) where
-    a: action in {STOP, LOG, PROGRESS, SAVE}
-    l: logging level
+    a: action in {STOP, LOG, PROGRESS, SAVE, OBJ, BATCH, GET, SPAN,
+                  METRICS}
+    l: logging level, or the monotonic time the batch was sent for BATCH
     kwargs: parameters for the action
         STOP: None
         LOG: message to log
         PROGRESS: name/i_max/iteration
         SAVE: Object to save/optional nameFile
+        OBJ: name/obj/iteration/time, stored in log_objects
+        BATCH: list of logging entries, treated in order, and the id of
+            the worker process which sent them
+        GET: name of the logged objects to send back in h.qout
+        SPAN: name/ph/ts/pid/tid of a span begin ('B') or end ('E')
+        METRICS: None, the metrics of the handler are sent back in h.qout
+
+    The input queue holds at most queue_size batches, 0 for no bound. The
+    Logger overflow policy decides what happens when it is full.
+
+    With spill_dir, the logged objects are written on disk in chunks of
+    spill_chunk rows and can be read with spill.open_trajectories.
+
+    With trace, the handled records are appended to this binary trace
+    file, which can be read with trace.TraceReader or replayed offline
+    with trace.replay. With chrome_trace, the spans are written in this
+    Chrome trace-event JSON file when the handler stops. With metrics,
+    the handler counts the records, their latency and its time in each
+    branch, see metrics.HandlerMetrics.
+
+    The progress bars are drawn by a progress.ProgressRenderer, at most
+    progress_fps times per second.
+
+    matplotlib is only imported with the first graphical record. With
+    graph_dir, the figures are not displayed but saved in this directory
+    as name.graph_format files, at most every graph_save seconds. The
+    curves are decimated to about graph_points displayed points.
     """
-    def __init__(self, levl=logging.DEBUG, name='root', process=None,
-                 graph_update=0.4, default_line_style='-o'):
-        super(Handler, self).__init__(name='Log_process')
+    def _init_handler(self, levl=logging.DEBUG, name='toolboxTom.handler',
+                      process=None, graph_update=0.4, default_line_style='-o',
+                      spill_dir=None, spill_chunk=4096, graph_dir=None,
+                      graph_format='png', graph_save=5, graph_points=2000,
+                      queue_size=256, trace=None, chrome_trace=None,
+                      metrics=False, progress_fps=10, queue_class=Queue):
         self.daemon = True
         self.process = process
-        # Get root logger
+        # Dedicated logger, which does not propagate the records to the
+        # root logger of the application running the thread handler
         self.log = logging.getLogger(name)
+        self.log.propagate = False
         # Add a default handler to print in console
         if len(self.log.handlers) < 1:
             ch = logging.StreamHandler(out)
@@ -43,22 +84,46 @@ class Handler(Process):
             ch.setFormatter(formatter)
             self.log.addHandler(ch)
 
-        # Start the concurent queue
-        self.qin = Queue()
+        # Start the concurent queue, bounded to queue_size batches
+        self.qin = queue_class(queue_size)
+        self._pending = deque()
+
+        # Self metrics, and action, latency and start time of the record
+        # being handled
+        self.metrics = HandlerMetrics() if metrics else None
+        self._current = None
 
-        # Progress logging fields
-        self.last_writter = ''
-        self.unfinished = False
+        # Progress logging fields, the renderer is created in run
+        self.progress_fps = progress_fps
+        self.bars = None
+        self.workers = defaultdict(dict)
+        self.wid = None
 
         # Object saving handles
-        self.manager = Manager()
-        self.log_objects = self.manager.dict()
+        self.log_objects = TrajectoryStore(spill_dir, spill_chunk)
+        self.qout = queue_class()
 
         # Graphical logging handling
         self.graph = defaultdict(lambda: defaultdict(lambda: None))
+        self.curves = defaultdict(dict)
+        self.background = {}
+        self.graph_points = graph_points
         self.lst_time = defaultdict(lambda: 0)
         self.default_line_style = default_line_style
         self.graph_update = graph_update
+        self.graph_dir = graph_dir
+        self.graph_format = graph_format
+        self.graph_save = graph_save
+        self.lst_save = defaultdict(lambda: 0)
+        self._plt = None
+
+        # Binary trace of the records, opened when the handler starts
+        self.trace_file = trace
+        self.trace = None
+
+        # Begin/end records of the spans
+        self.spans = []
+        self.chrome_trace = chrome_trace
 
         # Set the level  to its default value
         self.level = 0
@@ -85,6 +150,9 @@ class Handler(Process):
         if DEBUG or self.level < 10:
             self._log(10, 'HANDLER - Start properly with level {}'
                       ''.format(self.level))
+        if self.trace_file is not None:
+            self.trace = TraceWriter(self.trace_file, t_start=time())
+        self.bars = ProgressRenderer(out, fps=self.progress_fps)
         while True:
             try:
                 action, levl, entry, logger = self._treat()
@@ -93,11 +161,22 @@ class Handler(Process):
                     break
                 elif action == PASS:
                     continue
+                elif action == GET:
+                    self.qout.put(self.log_objects.snapshot(**entry))
+                    continue
+                elif action == METRICS:
+                    self.qout.put({} if self.metrics is None
+                                  else self.metrics.summary())
+                    continue
                 elif action == LEVEL:
                     self.set_mode(levl=levl)
                 if levl < self.level:
                     continue
-                if action == PROGRESS:
+                if action != OBJ:
+                    self._trace_record(action, levl, entry)
+                if action == PROGRESS and self.wid is not None:
+                    self._worker_progress(levl, **entry)
+                elif action == PROGRESS:
                     self._progress(levl, **entry)
                 elif action == SAVE:
                     self._save(levl, **entry)
@@ -109,10 +188,18 @@ class Handler(Process):
                         msg = traceback.format_exc()
                         self._log(40, 'HANDLER - fail to log graph cost:\n{}'
                                   '\n\n'.format(msg))
+                elif action == LOG and self.wid is not None:
+                    self._log(levl, 'Worker {} - {}'.format(self.wid, entry))
                 elif action == LOG:
                     self._log(levl, entry)
+                elif action == SPAN:
+                    self.spans.append(entry)
                 elif action == OBJ:
-                    self._log_obj(**entry)
+                    fobj = self._log_obj(**entry)
+                    if self.trace is not None:
+                        entry = dict(entry, obj=fobj)
+                        entry.pop('fun', None)
+                        self._trace_record(action, levl, entry)
             except ValueError:
                 import traceback
                 msg = traceback.format_exc()
@@ -127,71 +214,115 @@ class Handler(Process):
                 msg_form += '='*79+'\n'
                 msg_form += msg+'\n'+'='*79+'\n'
                 self._log(40, msg_form)
+        for name in self.workers:
+            self.bars.finish(name)
+        self.bars.close()
+        self.log_objects.close()
+        if self.trace is not None:
+            self.trace.close()
+        if self.chrome_trace is not None:
+            chrome_trace(self.spans, self.chrome_trace)
+        if self.graph_dir is not None:
+            for name in self.graph:
+                self._save_fig(name)
         if DEBUG or self.level < 10:
             self._log(10, 'HANDELER - Clean quit')
         return 0
 
     def _treat(self):
+        if self._current is not None:
+            action, latency, t0 = self._current
+            self.metrics.record(action, latency, monotonic()-t0)
+            self._current = None
         try:
-            entry = self.qin.get(True, 2)
+            t_sent = None
+            if len(self._pending) == 0:
+                entry = self.qin.get(True, 2)
+                self.wid = None
+                if entry[0] == BATCH:
+                    # The last field of a batch is the id of the worker
+                    self._pending.extend((entry[3], entry[1], r)
+                                         for r in entry[2])
+                    if self.metrics is not None:
+                        self.metrics.batch(self._qsize())
+                    return PASS, None, None, None
+            else:
+                self.wid, t_sent, entry = self._pending.popleft()
+            if self.metrics is not None:
+                t0 = monotonic()
+                self._current = (entry[0], None if t_sent is None
+                                 else t0 - t_sent, t0)
             if DEBUG or self.level < logging.DEBUG:
                 if entry[0] != OBJ:
                     self._log(10, 'HANDLER - Got entry {}'
                                   ''.format(entry))
             return entry
         except Empty:
+            if self.trace is not None:
+                self.trace.flush()
             return PASS, None, None, None
 
-    def _begin_line(self):
-        if self.unfinished:
-            out.write('\n')
+    def _qsize(self):
+        try:
+            return self.qin.qsize()
+        except NotImplementedError:
+            # qsize is not available on all platforms
+            return 0
+
+    def _trace_record(self, action, levl, entry):
+        if self.trace is not None:
+            self.trace.write(action, levl, entry, self.wid, time())
 
     def _log(self, levl, msg, **kwargs):
-        if self.unfinished:
-            out.write('\n')
-        self.unfinished = False
-        self.last_writter = ''
-        self.log.log(levl, msg, **kwargs)
+        if self.bars is None:
+            self.log.log(levl, msg, **kwargs)
+            return
+        # Write the message above the progress bars
+        with self.bars.lock:
+            self.bars.clear()
+            self.log.log(levl, msg, **kwargs)
 
     def _progress(self, levl=logging.INFO, iteration=0,
                   name='Progress', i_max=100):
         '''Function to log progress'''
-        # If the previous line wasn't a current progress line
-        # Start a new progress logging line
-        if self.last_writter != name:
-            self.lst_time[name] = 0
-            self._begin_line()
-            self.unfinished = True
-            out.write('{} - {} - '.format(logging.getLevelName(levl), name))
-            out.write(' '*7)
-
-            #Update progresse entry
-        if time() - self.lst_time[name] >= 0.1:
-            self.lst_time[name] = time()
-            out.write('\b'*7 + '{:7.2%}'.format(iteration/i_max))
-
-        # End the current progress entry if the i_max is reached
-        if iteration >= i_max and self.unfinished:
-            out.write('\b'*7 + 'Done   \n')
-            self.unfinished = False
-            self.last_writter = ''
-
-        out.flush()
-        self.last_writter = name
+        self.bars.update(name, iteration, i_max, levl)
+
+    def _worker_progress(self, levl=logging.INFO, iteration=0,
+                         name='Progress', i_max=100):
+        '''Merge the progress of the workers in a single progress line
+
+        The line shows the total of the iterations and of the i_max of
+        the workers reporting name since the handler started. The workers
+        can start after the others are done, so the line is only done
+        when the handler stops.
+        '''
+        workers = self.workers[name]
+        workers[self.wid] = (min(iteration, i_max), i_max)
+        self.bars.update(name, sum(it for it, _ in workers.values()),
+                         sum(n for _, n in workers.values()), levl,
+                         done=False)
 
     def _graph_cost(self, cost=1, iteration=None,
                     name='Cost', curve='cost', end=False, linestyle=None,
                     scale='log', **kwargs):
-        import matplotlib.pyplot as plt
+        plt = self._pyplot()
         if end:
             if DEBUG or self.level < 10:
                 self._log(10, 'HANDLER - End graphical cost follow up')
             self._update_fig(name)
+            if self.graph_dir is not None:
+                self._save_fig(name)
             line = self.graph[name]['old'+curve]
             if line is not None:
                 line.remove()
-            self.graph[name]['old'+curve] = self.graph[name][curve]
+            line = self.graph[name][curve]
+            if line is not None:
+                # The finished curve is now part of the background
+                line.set_animated(False)
+                self.background.pop(name, None)
+            self.graph[name]['old'+curve] = line
             self.graph[name][curve] = None
+            self.curves[name].pop(curve, None)
             return
         # Update the graph
         line = self.graph[name][curve]
@@ -210,14 +341,14 @@ class Handler(Process):
                                 self.default_line_style,
                                 label=curve, **kwargs)[0]
             plt.legend()
-        else:
-            x = line.get_xdata()
-            if iteration is None:
-                iteration = x[-1]+1
-            x = np.r_[x, iteration]
-            i0 = x.argsort()
-            line.set_xdata(x[i0])
-            line.set_ydata(np.r_[line.get_ydata(), [cost]][i0])
+            # The live curves are drawn with blitting on screen
+            line.set_animated(self.graph_dir is None and getattr(
+                line.figure.canvas, 'supports_blit', False))
+            self.curves[name][curve] = Curve(self.graph_points)
+            self.background.pop(name, None)
+        elif iteration is None:
+            iteration = self.curves[name][curve].x_last+1
+        self.curves[name][curve].append(iteration, cost)
 
         if linestyle is not None:
             line.set_linestyle(linestyle)
@@ -228,17 +359,69 @@ class Handler(Process):
         if time()-self.lst_time[name] >= self.graph_update:
             self._update_fig(name)
 
+    def _pyplot(self):
+        '''Import matplotlib.pyplot for the first graphical record
+        '''
+        if self._plt is None:
+            import matplotlib as mpl
+            if self.graph_dir is not None:
+                mpl.use('Agg')
+                os.makedirs(self.graph_dir, exist_ok=True)
+            else:
+                mpl.interactive(True)
+            import matplotlib.pyplot as plt
+            self._plt = plt
+        return self._plt
+
     def _update_fig(self, name):
-        import matplotlib.pyplot as plt
+        '''Redraw the figure name with the new points of its curves
+
+        When all the points are inside the current axes limits, only the
+        live curves are redrawn on the saved background (blitting).
+        '''
+        plt = self._pyplot()
         fig = plt.figure(name)
-        plt.draw()
         ax = fig.get_axes()[0]
-        ax.relim()
-        ax.autoscale_view()
-        fig.canvas.draw()
-        fig.canvas.flush_events()
+        lines, inside = [], True
+        xlim, ylim = ax.get_xlim(), ax.get_ylim()
+        for curve, c in self.curves[name].items():
+            line = self.graph[name][curve]
+            line.set_data(*c.display())
+            inside = inside and c.inside(xlim, ylim)
+            lines.append(line)
+
+        canvas = fig.canvas
+        if self.graph_dir is not None:
+            ax.relim()
+            ax.autoscale_view()
+            if time() - self.lst_save[name] >= self.graph_save:
+                self._save_fig(name)
+        elif (inside and self.background.get(name) is not None and
+                getattr(canvas, 'supports_blit', False)):
+            canvas.restore_region(self.background[name])
+            for line in lines:
+                ax.draw_artist(line)
+            canvas.blit(ax.bbox)
+            canvas.flush_events()
+        else:
+            ax.relim()
+            ax.autoscale_view()
+            canvas.draw()
+            if getattr(canvas, 'supports_blit', False):
+                self.background[name] = canvas.copy_from_bbox(ax.bbox)
+                for line in lines:
+                    ax.draw_artist(line)
+                canvas.blit(ax.bbox)
+            canvas.flush_events()
         self.lst_time[name] = time()
 
+    def _save_fig(self, name):
+        plt = self._pyplot()
+        fname = '{}.{}'.format(str(name).replace(os.sep, '_'),
+                               self.graph_format)
+        plt.figure(name).savefig(os.path.join(self.graph_dir, fname))
+        self.lst_save[name] = time()
+
     def _save(self, levl, obj, fname='.pkl'):
 
         if fname[0] == '.':
@@ -250,18 +433,34 @@ class Handler(Process):
                  time=None):
         if fun is None:
             fun = np.copy
-        fobj = fun(obj)
-        l = self.log_objects.get(name, [])
-        l += [fobj]
-        self.log_objects[name] = l
-        if iteration is not None:
-            l = self.log_objects.get(name+'_i', [])
-            l += [iteration]
-            self.log_objects[name+'_i'] = l
-        if time is not None:
-            l = self.log_objects.get(name+'_t', [])
-            l += [time]
-            self.log_objects[name+'_t'] = l
+        if isinstance(obj, SharedArray):
+            fobj = obj.load(fun)
+        else:
+            fobj = fun(obj)
+        self.log_objects.append(name, fobj, iteration=iteration, time=time)
         if graph_cost is not None:
             graph_cost.update(iteration=iteration)
             self._graph_cost(cost=fobj, **graph_cost)
+        return fobj
+
+
+class Handler(BaseHandler, Process):
+    """Asynchronous logging handler, running in its own process
+
+    See BaseHandler for the parameters.
+    """
+    def __init__(self, levl=logging.DEBUG, **kwargs):
+        super(Handler, self).__init__(name='Log_process')
+        self._init_handler(levl, queue_class=Queue, **kwargs)
+
+
+class ThreadHandler(BaseHandler, Thread):
+    """Logging handler running in a thread of the logging process
+
+    The records are not pickled and no process is started, but the
+    handler shares the GIL with the code it logs.
+    See BaseHandler for the parameters.
+    """
+    def __init__(self, levl=logging.DEBUG, **kwargs):
+        super(ThreadHandler, self).__init__(name='Log_thread')
+        self._init_handler(levl, queue_class=queue.Queue, **kwargs)
@@ -2,6 +2,8 @@ from sys import stdout as out
 
 import logging
 
+from .progress import ProgressRenderer
+
 
 class Logger(logging.Logger):
     """Logging handler"""
@@ -16,27 +18,12 @@ class Logger(logging.Logger):
                                           '- %(message)s')
             ch.setFormatter(formatter)
             self.addHandler(ch)
-        self.last_wr = ''
-        self.is_prog = False
+        self.bars = ProgressRenderer(out)
 
     def progress(self, name, i, i_max, levl=logging.INFO):
         if self.level > levl:
             return
-        if self.last_wr != name:
-            if self.is_prog:
-                out.write('\n')
-            self.is_prog = True
-            out.write('{} - {} - '.format(logging.getLevelName(levl), name))
-            out.write(' '*7)
-            self.last_wr = name
-        out.write('\b'*7 + '{:7.2%}'.format(i/i_max))
-        if i == i_max-1:
-            out.write('\r{} - {} - Done   '
-                      ''.format(logging.getLevelName(levl), name))
-            out.write('\n')
-            self.is_prog = False
-            self.last_wr = ''
-        out.flush()
+        self.bars.update(name, i+1, i_max, levl)
 
     def set_mode(self, levl=logging.INFO):
         self.debug('Set mode: {}'.format(logging.getLevelName(levl)))
@@ -44,50 +31,40 @@ class Logger(logging.Logger):
         for ch in self.handlers:
             ch.setLevel(levl)
 
+    def _write(self, log_fun, msg, **kwargs):
+        # Write the message above the progress bars
+        with self.bars.lock:
+            self.bars.clear()
+            log_fun(msg, **kwargs)
+
     def debug(self, msg, **kwargs):
         if self.level > 10:
             return
-        if self.is_prog:
-            out.write('\n')
-        self.is_prog = False
-        self.last_wr = ''
-        super(Logger, self).debug(msg, **kwargs)
+        self._write(super(Logger, self).debug, msg, **kwargs)
 
     def info(self, msg, **kwargs):
         if self.level > 20:
             return
-        if self.is_prog:
-            out.write('\n')
-        self.is_prog = False
-        self.last_wr = ''
-        super(Logger, self).info(msg, **kwargs)
+        self._write(super(Logger, self).info, msg, **kwargs)
 
     def warning(self, msg, **kwargs):
         if self.level > 30:
             return
-        if self.is_prog:
-            out.write('\n')
-        self.is_prog = False
-        self.last_wr = ''
-        super(Logger, self).warning(msg, **kwargs)
+        self._write(super(Logger, self).warning, msg, **kwargs)
 
     def error(self, msg, **kwargs):
         if self.level > 40:
             return
-        if self.is_prog:
-            out.write('\n')
-        self.is_prog = False
-        self.last_wr = ''
-        super(Logger, self).error(msg, **kwargs)
+        self._write(super(Logger, self).error, msg, **kwargs)
 
     def critical(self, msg, **kwargs):
         if self.level > 50:
             return
-        if self.is_prog:
-            out.write('\n')
-        self.is_prog = False
-        self.last_wr = ''
-        super(Logger, self).exception(msg, **kwargs)
+        self._write(super(Logger, self).exception, msg, **kwargs)
+
+    def close(self):
+        '''Draw the last frame of the progress bars'''
+        self.bars.close()
 
 
 if __name__ == '__main__':
@@ -97,3 +74,4 @@ if __name__ == '__main__':
 
     for i in range(i_max):
         log.progress('Counter', i, i_max)
+    log.close()
@@ -1,9 +1,21 @@
+import os
 import logging
+import numpy as np
+import threading
 import multiprocessing
+from queue import Full, Empty
+from collections import defaultdict
+from multiprocessing import resource_tracker
+from multiprocessing.util import Finalize
+from time import time, sleep, monotonic
 
 
-from . import STOP, LOG, PROGRESS, SAVE, COST, OBJ, LEVEL
-from .handler_p import Handler
+from . import STOP, LOG, PROGRESS, SAVE, COST, OBJ, LEVEL, BATCH, GET
+from . import METRICS
+from .handler_p import Handler, ThreadHandler
+from .shared_array import SharedArrayPool, SharedArray
+from .span import Span
+from .metrics import action_name, format_metrics
 
 from . import DEBUG
 
@@ -18,42 +30,381 @@ class Logger(object):
     use end to stop the logger
     """
     output = None
+    # # of Loggers which sent records and did not end, the handler is
+    # stopped when the last of them ends. The Loggers created at import
+    # and never used do not keep the handler alive.
     references = 0
     _alive = False
 
+    # Records are buffered in each process and sent to the handler in
+    # batches of at most batch_size records, or batch_delay seconds old.
+    batch_size = 256
+    batch_delay = 0.05
+    _buffer = []
+    _buffer_time = 0
+    _buffer_pid = None
+    _flusher_pid = None
+    _lock = None
+
+    # Evaluate the fun of log_obj in the calling process, so only its
+    # result is sent to the handler instead of the function and its owner.
+    local_fun = True
+
+    # Arrays bigger than shm_threshold bytes are sent to the handler
+    # through a pool of shm_slots shared memory slots instead of a pickle.
+    shm_threshold = 1 << 16
+    shm_slots = 4
+    _pool = None
+
+    # Min time (in s) and fraction of i_max between two progress records
+    progress_interval = 0.1
+    progress_step = 0.001
+
+    # Policy when the handler queue is full, in {'block', 'drop-oldest',
+    # 'drop-level', 'sample'}, and # of dropped records per action
+    overflow = 'block'
+    drop_level = logging.DEBUG
+    sample_rate = 10
+    dropped = defaultdict(int)
+    _n_sampled = 0
+
+    # Count the records sent per action and ask the handler to measure
+    # its treatment of the records. They are printed at end.
+    metrics = False
+    enqueued = defaultdict(int)
+
+    # The handler runs in a 'process' or in a 'thread' of this process.
+    # It is started with the first record which is not a LEVEL change.
+    backend = 'process'
+    handler_params = {}
+
+    # In worker processes, queue of the handler of the parent process and
+    # id of the worker, set with Logger.attach
+    _collector = None
+    _wid = None
+
     @staticmethod
     def restart():
-        if Logger.output is None or not Logger.output.is_alive():
+        if Logger._collector is not None:
+            return Logger._collector
+        if not Logger._running():
             process = multiprocessing.current_process()
-            Logger.output = Handler(levl=10, process=process)
+            if Logger.backend == 'thread':
+                Logger.output = ThreadHandler(levl=10, process=process,
+                                              metrics=Logger.metrics,
+                                              **Logger.handler_params)
+            else:
+                # The handler should share our tracker for the shared arrays
+                resource_tracker.ensure_running()
+                Logger.output = Handler(levl=10, process=process,
+                                        metrics=Logger.metrics,
+                                        **Logger.handler_params)
             Logger.output.start()
             Logger._alive = True
         return Logger.output.get_pin()
 
+    @staticmethod
+    def collector():
+        '''Return the queue of the output handler, to share with workers
+
+        The child processes call Logger.attach with this queue to send
+        their records to this handler instead of starting their own.
+        Return None with the thread backend, which cannot be shared.
+        '''
+        if Logger.backend == 'thread' and Logger._collector is None:
+            return None
+        # The handler started here is stopped at exit
+        Logger._init_buffer(flusher=True)
+        with Logger._lock:
+            return Logger.restart()
+
+    @staticmethod
+    def attach(collector, worker_id=None):
+        '''Send the records of this process to a collector
+
+        Should be called at the start of a child process with the queue
+        returned by Logger.collector in the parent process. Its records
+        are tagged with worker_id and its progress merged with the ones
+        of the other workers. If collector is None, this process starts
+        its own handler when needed.
+
+        Parameters
+        ----------
+        collector: queue returned by Logger.collector
+        worker_id: id of the process in the records
+        '''
+        Logger._init_buffer()
+        Logger.output = None
+        Logger._alive = False
+        Logger._collector = collector
+        Logger._wid = worker_id
+
+    @staticmethod
+    def _running():
+        '''Return True if this process runs a live output handler
+        '''
+        output = Logger.output
+        if output is None:
+            return False
+        if isinstance(output, Handler) and output._parent_pid != os.getpid():
+            # Handler inherited from the parent process
+            return False
+        return output.is_alive()
+
+    @staticmethod
+    def configure(batch_size=None, batch_delay=None, local_fun=None,
+                  shm_threshold=-1, shm_slots=None, progress_interval=None,
+                  progress_step=None, overflow=None, drop_level=None,
+                  sample_rate=None, backend=None, metrics=None,
+                  **handler_params):
+        '''Set the parameters of the logging pipeline
+
+        Parameters
+        ----------
+        batch_size: max # of records sent to the handler in one batch
+        batch_delay: max age (in s) of a buffered record before flush
+        local_fun: if False, the fun of log_obj is sent to the handler
+            and evaluated there
+        shm_threshold: min # of bytes of an array to send it through
+            shared memory, None to always pickle the arrays
+        shm_slots: # of shared memory slots for the arrays
+        progress_interval: min time (in s) between two progress records
+            with the same name
+        progress_step: min fraction of i_max between two progress records
+            with the same name
+        overflow: policy when the handler queue is full
+            'block': wait for the handler
+            'drop-oldest': drop the oldest batch in the queue
+            'drop-level': drop the records with level <= drop_level
+            'sample': only keep 1 out of sample_rate records below WARNING
+        backend: run the handler in a 'process' or in a 'thread'
+        metrics: if True, measure the logging pipeline, see get_metrics.
+            It is used for the next started handler.
+        handler_params: parameters of the Handler, e.g. spill_dir, trace,
+            chrome_trace or queue_size. They are used for the next
+            started handler.
+        '''
+        if backend is not None:
+            assert backend in ['process', 'thread'], (
+                '{} is not a logging backend'.format(backend))
+            Logger.backend = backend
+        if overflow is not None:
+            assert overflow in ['block', 'drop-oldest', 'drop-level',
+                                'sample'], (
+                '{} is not an overflow policy'.format(overflow))
+            Logger.overflow = overflow
+        if drop_level is not None:
+            Logger.drop_level = drop_level
+        if metrics is not None:
+            Logger.metrics = metrics
+        if sample_rate is not None:
+            Logger.sample_rate = max(int(sample_rate), 1)
+        Logger.handler_params.update(handler_params)
+        if shm_threshold != -1:
+            Logger.shm_threshold = shm_threshold
+        if shm_slots is not None:
+            Logger.shm_slots = shm_slots
+        if progress_interval is not None:
+            Logger.progress_interval = progress_interval
+        if progress_step is not None:
+            Logger.progress_step = progress_step
+        if local_fun is not None:
+            Logger.local_fun = local_fun
+        if batch_size is not None:
+            Logger.batch_size = max(int(batch_size), 1)
+        if batch_delay is not None:
+            Logger.batch_delay = batch_delay
+
+    @staticmethod
+    def _init_buffer(flusher=False):
+        '''Reset the record buffer if we are in a new process
+
+        The buffer, its lock and its flushing thread are not valid anymore
+        in a forked process, so they are recreated for each pid. The
+        flushing thread and the delivery at exit are only started with
+        flusher, when there is something to send, so the Loggers which
+        only set their level do not leave a thread in each process.
+        '''
+        pid = os.getpid()
+        if Logger._buffer_pid != pid:
+            Logger._buffer = []
+            Logger._buffer_pid = pid
+            Logger._lock = threading.Lock()
+            # The slots of the parent process are not ours to release
+            Logger._pool = None
+        if flusher and Logger._flusher_pid != pid:
+            Logger._flusher_pid = pid
+            thread = threading.Thread(target=Logger._flush_loop,
+                                      args=(pid,), name='Log_flush')
+            thread.daemon = True
+            thread.start()
+            # Run before the multiprocessing queues are closed at exit
+            Finalize(None, Logger._exit, exitpriority=20)
+
+    @staticmethod
+    def _exit():
+        '''Deliver the remaining records when the process exits
+        '''
+        Logger.flush()
+        if Logger._alive and Logger._running():
+            Logger.output.get_pin().put((STOP, None, None, None))
+            Logger.output.join()
+            Logger._alive = False
+            Logger._close_pool()
+        elif Logger._collector is not None:
+            # Let the collector read the shared arrays before releasing them
+            Logger._close_pool(wait=5)
+
+    @staticmethod
+    def _share(arr):
+        '''Return a SharedArray holding a copy of arr, or None
+        '''
+        if (Logger.shm_threshold is None or Logger.backend == 'thread' or
+                arr.nbytes < Logger.shm_threshold):
+            return None
+        Logger._init_buffer()
+        if Logger._pool is None:
+            Logger._pool = SharedArrayPool(Logger.shm_slots)
+        return Logger._pool.put(arr)
+
+    @staticmethod
+    def _close_pool(wait=0):
+        if Logger._pool is not None and Logger._buffer_pid == os.getpid():
+            Logger._pool.close(wait)
+            Logger._pool = None
+
+    @staticmethod
+    def _flush_loop(pid):
+        '''Flush the buffer when its records get older than batch_delay
+        '''
+        while Logger._buffer_pid == pid:
+            # Wake up regularly so a shorter batch_delay set by configure
+            # is used without waiting for the end of a longer one
+            sleep(min(Logger.batch_delay, .1))
+            try:
+                if (len(Logger._buffer) > 0 and time() - Logger._buffer_time
+                        >= Logger.batch_delay):
+                    Logger.flush()
+            except Exception:
+                pass
+
+    @staticmethod
+    def flush():
+        '''Send all the buffered records to the output handler
+        '''
+        if Logger._buffer_pid != os.getpid():
+            # Nothing was logged in this process
+            return
+        with Logger._lock:
+            if len(Logger._buffer) == 0:
+                return
+            if not Logger._running() and all(
+                    r[0] == LEVEL for r in Logger._buffer):
+                # Do not start a handler only to change its level
+                return
+            batch, Logger._buffer = Logger._buffer, []
+            try:
+                qin = Logger.restart()
+                Logger._put(qin, batch)
+            except Exception:
+                print('== ERROR - LOGGER - Fail to log {} records'
+                      ''.format(len(batch)))
+
+    @staticmethod
+    def _put(qin, batch):
+        '''Put a batch in the handler queue, with the overflow policy
+        '''
+        try:
+            Logger._send(qin, batch, False)
+            return
+        except Full:
+            pass
+
+        if Logger.overflow == 'drop-oldest':
+            while True:
+                try:
+                    old = qin.get(False)
+                    old = old[2] if old[0] == BATCH else [old]
+                    batch = Logger._drop(old) + batch
+                except Empty:
+                    pass
+                try:
+                    Logger._send(qin, batch, False)
+                    return
+                except Full:
+                    pass
+        elif Logger.overflow == 'drop-level':
+            batch = Logger._drop(batch, lambda r: r[1] > Logger.drop_level)
+        elif Logger.overflow == 'sample':
+            def keep(r):
+                if r[1] >= logging.WARNING:
+                    return True
+                Logger._n_sampled += 1
+                return Logger._n_sampled % Logger.sample_rate == 0
+            batch = Logger._drop(batch, keep)
+        if len(batch) > 0:
+            Logger._send(qin, batch)
+
+    @staticmethod
+    def _send(qin, batch, block=True):
+        qin.put((BATCH, monotonic(), batch, Logger._wid), block)
+        if Logger.metrics:
+            for r in batch:
+                Logger.enqueued[r[0]] += 1
+
+    @staticmethod
+    def _drop(batch, keep=None):
+        '''Drop the records of batch which are not kept
+
+        The control records are always kept and the shared memory slots
+        of the dropped records are released.
+
+        Return the kept records
+        '''
+        kept = []
+        for r in batch:
+            if r[0] in [STOP, LEVEL, GET, METRICS] or (
+                    keep is not None and keep(r)):
+                kept.append(r)
+                continue
+            Logger.dropped[r[0]] += 1
+            if r[0] == OBJ and isinstance(r[2]['obj'], SharedArray):
+                r[2]['obj'].release()
+        return kept
+
     def __init__(self, name='', levl=logging.INFO):
         '''Create a basic Logger and add a output handler
         '''
         super(Logger, self).__init__()
-        Logger.references += 1
+        self._referenced = False
         self.name = name
         self.running = True
+        self._progress_sent = {}
         self.set_level(levl)
 
     def __del__(self):
         if self.running:
             self.end()
 
-    def _log(self, entry):
+    def _log(self, entry, flush=False):
         try:
-            qin = Logger.restart()
             assert type(entry) == tuple
             assert len(entry) == 3
-            qin.put(entry+(self.name,), False)
-        except TimeoutError:
-            print('== ERROR - LOGGER - Fail to log', entry)
         except AssertionError:
             print('== ERROR - LOGGER - Bad entry in logger {}'
                   '\n'.format(self.name))
+            return
+        Logger._init_buffer(flusher=entry[0] != LEVEL)
+        if not self._referenced and self.running and entry[0] != LEVEL:
+            self._referenced = True
+            Logger.references += 1
+        with Logger._lock:
+            if len(Logger._buffer) == 0:
+                Logger._buffer_time = time()
+            Logger._buffer.append(entry+(self.name,))
+            flush = flush or len(Logger._buffer) >= Logger.batch_size
+        if flush:
+            Logger.flush()
 
     def _format(self, msg, *args):
         msg = str(msg)
@@ -76,21 +427,40 @@ class Logger(object):
     def end(self):
         '''Finish to handle the log entry and stop the output handler
         '''
-        Logger.references -= 1
-        if (Logger.references == 0 and Logger._alive and
-                Logger.output.is_alive()):
-            self._log((STOP, None, None))
+        # The last records sent by end do not reference this Logger again
+        self.running = False
+        if self._referenced:
+            self._referenced = False
+            Logger.references -= 1
+        Logger.flush()
+        if Logger.references <= 0 and Logger._running():
+            metrics = None
+            if Logger.metrics:
+                metrics = self.get_metrics()
+            n_dropped = sum(Logger.dropped.values())
+            if n_dropped > 0:
+                self._log((LOG, 30, 'LOGGER - {} records dropped with the '
+                           '{} policy: {}'.format(n_dropped, Logger.overflow,
+                                                  dict(Logger.dropped))))
+            self._log((STOP, None, None), flush=True)
             Logger.output.join()
             Logger._alive = False
-        self.running = False
+            Logger._close_pool()
+            if metrics is not None:
+                print(format_metrics(metrics))
 
     def kill(self):
-        if Logger._alive:
+        self.running = False
+        if self._referenced:
+            self._referenced = False
+            Logger.references -= 1
+        Logger.flush()
+        if Logger._running():
             self._log((LOG, 10, 'kill'))
-            self._log((STOP, None, None))
+            self._log((STOP, None, None), flush=True)
             Logger.output.join()
             Logger._alive = False
-        self.running = False
+            Logger._close_pool()
 
     def is_alive(self):
         return self._alive
@@ -126,18 +496,74 @@ class Logger(object):
         name: Name of the loop, to diferentiate the loops
         levl: Level of the log
         '''
+        if self.level > levl:
+            return
+        # Only send the progress every progress_interval seconds and
+        # progress_step fraction, the last update is always sent
+        t = time()
+        last = self._progress_sent.get(name)
+        done = iteration >= i_max
+        if last is not None and not done:
+            t_last, it_last = last
+            if (iteration >= it_last and (
+                    t - t_last < Logger.progress_interval or
+                    iteration - it_last < Logger.progress_step*i_max)):
+                return
+        if done:
+            self._progress_sent.pop(name, None)
+        else:
+            self._progress_sent[name] = (t, iteration)
+
         if self.name != '':
             name = self.name + ' - ' + name
-        if self.level <= levl:
-            kwargs.update(dict(iteration=iteration, i_max=i_max,
-                               name=name))
-            self._log((PROGRESS, levl, kwargs))
+        kwargs.update(dict(iteration=iteration, i_max=i_max,
+                           name=name))
+        self._log((PROGRESS, levl, kwargs))
 
-    def log_obj(self, levl=20, name='', obj=None, **kwargs):
+    def log_obj(self, levl=20, name='', obj=None, fun=None, **kwargs):
+        '''Log an object, typically the current point of an optimisation
+
+        Parameters
+        ----------
+        name: Name of the logged trajectory
+        obj: Object to log
+        fun: function to apply to obj before storing it. With local_fun,
+            it is evaluated here and only its result is sent.
+        levl: Level of the log
+        iteration/time: optional index stored with the object
+        graph_cost: optional parameters of graphical_cost to plot obj
+        '''
         if self.level <= levl and name != '' and obj is not None:
+            if fun is not None and Logger.local_fun:
+                obj = fun(obj)
+            else:
+                if fun is not None:
+                    kwargs['fun'] = fun
+            if isinstance(obj, np.ndarray):
+                # The record is sent later, obj can change until then
+                shared = Logger._share(obj)
+                obj = np.copy(obj) if shared is None else shared
             kwargs.update(dict(name=name, obj=obj))
             self._log((OBJ, levl, kwargs))
 
+    def span(self, name, levl=logging.DEBUG, **args):
+        '''Time a block or a function, as a context manager or a decorator
+
+            with log.span('update', iteration=i):
+                ...
+
+        The begin and end records hold monotonic timestamps, the pid and
+        the thread id. Set chrome_trace in Logger.configure to export the
+        spans in a Chrome trace-event JSON file.
+
+        Parameters
+        ----------
+        name: Name of the span
+        levl: Level of the log, the span costs a level check when disabled
+        args: optional arguments displayed with the span
+        '''
+        return Span(self, name, levl, args or None)
+
     def graphical_cost(self, cost=0, iteration=None, name='Cost',
                        levl=logging.INFO, end=False, **kwargs):
         '''Log a progression, typically for a loop,
@@ -158,7 +584,49 @@ class Logger(object):
         if self.level <= levl:
             self._log((SAVE, levl, kwargs))
 
+    def get_objects(self, name=None, timeout=10):
+        '''Return the objects logged with log_obj
+
+        The result is a dict with keys name, name+'_i' and name+'_t'
+        holding arrays of the values, iterations and times.
+
+        Parameters
+        ----------
+        name: name of the logged object, default to all of them
+        timeout: max time (in s) to wait for the handler
+        '''
+        if not Logger._running():
+            Logger.flush()
+        if not Logger._running():
+            return {}
+        self._log((GET, None, dict(name=name)), flush=True)
+        return Logger.output.qout.get(True, timeout)
+
+    def get_metrics(self, timeout=10):
+        '''Return the metrics of the logging pipeline
+
+        The result is a dict with the # of records enqueued, dropped and
+        handled per action, the time spent by the handler on each action,
+        the max # of batches in the queue and the histogram of the time
+        between the moment a batch is sent and the moment its records are
+        handled. The handler metrics are only measured with
+        Logger.configure(metrics=True).
+
+        Parameters
+        ----------
+        timeout: max time (in s) to wait for the handler
+        '''
+        Logger.flush()
+        res = dict(enqueued={action_name(a): n
+                             for a, n in Logger.enqueued.items()},
+                   dropped={action_name(a): n
+                            for a, n in Logger.dropped.items()})
+        if Logger._running():
+            self._log((METRICS, None, None), flush=True)
+            res.update(Logger.output.qout.get(True, timeout))
+        return res
+
     def process_queue(self):
-        import time
-        while Logger.output.qin.qsize() != 0:
-            time.sleep(0.4)
+        Logger.flush()
+        while Logger._running() and Logger.output.qin.qsize() != 0:
+            sleep(0.4)
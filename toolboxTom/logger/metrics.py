@@ -0,0 +1,89 @@
+from bisect import bisect
+from collections import defaultdict
+
+from . import STOP, PASS, LOG, PROGRESS, SAVE, COST, MODE, OBJ, LEVEL, FAIL
+from . import BATCH, GET, SPAN, METRICS
+
+ACTIONS = {STOP: 'STOP', PASS: 'PASS', LOG: 'LOG', PROGRESS: 'PROGRESS',
+           SAVE: 'SAVE', COST: 'COST', MODE: 'MODE', OBJ: 'OBJ',
+           LEVEL: 'LEVEL', FAIL: 'FAIL', BATCH: 'BATCH', GET: 'GET',
+           SPAN: 'SPAN', METRICS: 'METRICS'}
+
+# Upper bounds (in s) of the bins of the latency histogram
+LATENCY_BINS = [1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10]
+
+
+def action_name(action):
+    return ACTIONS.get(action, str(action))
+
+
+class HandlerMetrics(object):
+    """Counters of the records treated by a handler
+
+    For each action, the # of handled records and the time spent in its
+    branch of the handler loop, the max # of batches waiting in the
+    queue and the histogram of the time between the moment a batch is
+    put in the queue and the moment each of its records is handled.
+    """
+    def __init__(self):
+        self.handled = defaultdict(int)
+        self.branch_time = defaultdict(float)
+        self.n_batches = 0
+        self.queue_max = 0
+        self.latency = [0]*(len(LATENCY_BINS)+1)
+        self.latency_max = 0
+
+    def batch(self, depth):
+        '''Count a batch, with depth batches left in the queue'''
+        self.n_batches += 1
+        self.queue_max = max(self.queue_max, depth+1)
+
+    def record(self, action, latency, duration):
+        '''Count a handled record
+
+        Parameters
+        ----------
+        action: action of the record
+        latency: time (in s) between the batch put and its handling
+        duration: time (in s) spent to handle the record
+        '''
+        self.handled[action] += 1
+        self.branch_time[action] += duration
+        if latency is not None:
+            self.latency[bisect(LATENCY_BINS, latency)] += 1
+            self.latency_max = max(self.latency_max, latency)
+
+    def summary(self):
+        '''Return the metrics as a dict of builtin types'''
+        return dict(
+            handled={action_name(a): n for a, n in self.handled.items()},
+            branch_time={action_name(a): t
+                         for a, t in self.branch_time.items()},
+            n_batches=self.n_batches, queue_max=self.queue_max,
+            latency_bins=list(LATENCY_BINS), latency=list(self.latency),
+            latency_max=self.latency_max)
+
+
+def format_metrics(metrics):
+    '''Return a readable report of the metrics of Logger.get_metrics'''
+    lines = ['Logging metrics']
+    enqueued = metrics.get('enqueued', {})
+    handled = metrics.get('handled', {})
+    dropped = metrics.get('dropped', {})
+    branch_time = metrics.get('branch_time', {})
+    lines.append('{:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'action', 'enqueued', 'handled', 'dropped', 'time (s)'))
+    for name in sorted(set(enqueued) | set(handled)):
+        lines.append('{:>10} {:>10} {:>10} {:>10} {:>10.4f}'.format(
+            name, enqueued.get(name, 0), handled.get(name, 0),
+            dropped.get(name, 0), branch_time.get(name, 0)))
+    lines.append('batches: {}, max queue depth: {}'.format(
+        metrics.get('n_batches', 0), metrics.get('queue_max', 0)))
+    if 'latency' in metrics:
+        bounds = ['<{:g}s'.format(b) for b in metrics['latency_bins']]
+        bounds.append('>={:g}s'.format(metrics['latency_bins'][-1]))
+        lines.append('latency: ' + ', '.join(
+            '{} {}'.format(b, n) for b, n in zip(bounds, metrics['latency'])
+            if n > 0))
+        lines.append('max latency: {:.4f}s'.format(metrics['latency_max']))
+    return '\n'.join(lines)
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import threading
+from sys import stdout
+from time import time
+
+# ANSI sequences to move the cursor up and to clear the current line
+UP = '\x1b[{}A'
+CLEAR = '\r\x1b[2K'
+
+
+class ProgressBar(object):
+    """State of a named progress bar
+
+    The rate (in iterations/s) is an exponential moving average of the
+    rates measured between two frames of the renderer.
+    """
+    __slots__ = ['name', 'levl', 'iteration', 'i_max', 'rate', 't_start',
+                 't_last', 'it_last']
+
+    def __init__(self, name, levl, iteration, i_max):
+        self.name = name
+        self.levl = levl
+        self.iteration = iteration
+        self.i_max = i_max
+        self.rate = None
+        self.t_start = self.t_last = time()
+        self.it_last = iteration
+
+    def update_rate(self, t, smoothing):
+        dt = t - self.t_last
+        if dt <= 0:
+            return
+        rate = (self.iteration - self.it_last) / dt
+        if self.rate is None:
+            self.rate = rate
+        else:
+            self.rate += smoothing*(rate - self.rate)
+        self.t_last, self.it_last = t, self.iteration
+
+    def format(self, width=20):
+        frac = min(max(self.iteration / self.i_max, 0), 1) if self.i_max \
+            else 1
+        n = int(frac*width)
+        line = '{} - {} - {:7.2%} [{}{}] {}/{}'.format(
+            logging.getLevelName(self.levl), self.name, frac, '#'*n,
+            ' '*(width-n), self.iteration, self.i_max)
+        if self.rate is not None and self.rate > 0:
+            eta = (self.i_max - self.iteration) / self.rate
+            line += ' - {} it/s - ETA {}'.format(_format_rate(self.rate),
+                                                 _format_time(eta))
+        return line
+
+    def format_done(self):
+        return '{} - {} - Done   {} iterations in {}'.format(
+            logging.getLevelName(self.levl), self.name, self.iteration,
+            _format_time(time() - self.t_start))
+
+
+def _format_rate(rate):
+    if rate >= 1e6:
+        return '{:.2f}M'.format(rate/1e6)
+    if rate >= 1e3:
+        return '{:.2f}k'.format(rate/1e3)
+    return '{:.2f}'.format(rate)
+
+
+def _format_time(t):
+    t = int(t)
+    if t >= 3600:
+        return '{}:{:02d}:{:02d}'.format(t // 3600, t // 60 % 60, t % 60)
+    return '{:02d}:{:02d}'.format(t // 60, t % 60)
+
+
+class ProgressRenderer(object):
+    """Keep several named progress bars at the bottom of the terminal
+
+    update only stores the new iteration of the bar. The bars are redrawn
+    by a timer thread, fps times per second, and a finished bar is
+    replaced by a Done line which stays above the live bars. When out is
+    not a terminal, only the Done lines are written.
+
+    Parameters
+    ----------
+    out: stream where the bars are drawn
+    fps: # of redraws per second
+    smoothing: weight of the last measure in the moving average of the
+        rates, in (0, 1]
+    width: # of characters of the bars
+    """
+    def __init__(self, out=stdout, fps=10, smoothing=.3, width=20):
+        self.out = out
+        self.fps = fps
+        self.smoothing = smoothing
+        self.width = width
+        self.bars = {}
+        self.finished = []
+        self.n_lines = 0
+        self.lock = threading.RLock()
+        self.live = getattr(out, 'isatty', lambda: False)()
+        self._stop = threading.Event()
+        self._timer = None
+
+    def update(self, name, iteration, i_max, levl=logging.INFO, done=None):
+        '''Set the iteration of the bar name, created if needed
+
+        The bar is finished when done, by default when iteration reaches
+        i_max. With done False, it stays live until finish is called.
+        '''
+        bar = self.bars.get(name)
+        if bar is None:
+            with self.lock:
+                self.bars[name] = ProgressBar(name, levl, iteration, i_max)
+            if self._timer is None:
+                self._start()
+        else:
+            bar.iteration = iteration
+            bar.i_max = i_max
+        if done is None:
+            done = iteration >= i_max
+        if done:
+            self.finish(name)
+
+    def finish(self, name):
+        '''Replace the live bar name by its Done line'''
+        with self.lock:
+            bar = self.bars.pop(name, None)
+            if bar is not None:
+                self.finished.append(bar)
+
+    def _start(self):
+        self._stop.clear()
+        self._timer = threading.Thread(target=self._loop,
+                                       name='Progress_renderer')
+        self._timer.daemon = True
+        self._timer.start()
+        # Write the Done lines left when the process exits
+        atexit.register(self.close)
+
+    def _loop(self):
+        while not self._stop.wait(1 / self.fps):
+            try:
+                self.render()
+            except Exception:
+                pass
+
+    def clear(self):
+        '''Erase the live bars, before writing another line in out
+
+        The bars are drawn again at the next frame. Should be called with
+        the lock held, so no frame is drawn before the line is written.
+        '''
+        with self.lock:
+            if self.n_lines > 0:
+                self.out.write(UP.format(self.n_lines)
+                               + (CLEAR + '\n')*self.n_lines
+                               + UP.format(self.n_lines))
+                self.n_lines = 0
+
+    def render(self):
+        '''Draw the finished bars and the live bars'''
+        with self.lock:
+            t = time()
+            lines = [bar.format_done() for bar in self.finished]
+            self.finished = []
+            if self.live:
+                for bar in self.bars.values():
+                    bar.update_rate(t, self.smoothing)
+                live = [bar.format(self.width) for bar in self.bars.values()]
+            else:
+                live = []
+            if len(lines) == 0 and len(live) == 0 and self.n_lines == 0:
+                return
+            buf = ''
+            if self.n_lines > 0:
+                buf += UP.format(self.n_lines)
+            clear = CLEAR if self.live else ''
+            buf += ''.join(clear + line + '\n' for line in lines + live)
+            # Clear the lines of the bars which are not live anymore
+            n_old = self.n_lines - len(lines) - len(live)
+            if n_old > 0:
+                buf += (CLEAR + '\n')*n_old + UP.format(n_old)
+            self.n_lines = len(live)
+            self.out.write(buf)
+            self.out.flush()
+
+    def close(self):
+        '''Stop the timer and draw the last frame'''
+        if self._timer is not None:
+            self._stop.set()
+            self._timer.join()
+            self._timer = None
+        self.render()
@@ -0,0 +1,121 @@
+import numpy as np
+from time import time, sleep
+from multiprocessing import shared_memory
+
+# The first byte of each slot is a flag telling if the slot is in use.
+# The array is stored after a small header to keep it aligned.
+FREE = 0
+BUSY = 1
+HEADER = 64
+
+
+class SharedArray(object):
+    """Descriptor of an array stored in a shared memory slot
+
+    Only this descriptor goes through the handler queue. The receiver
+    maps the slot with load and releases it for the next array.
+    """
+    def __init__(self, name, shape, dtype, offset=HEADER):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.offset = offset
+
+    def __repr__(self):
+        return 'SharedArray({}, {}, {})'.format(self.name, self.shape,
+                                                self.dtype)
+
+    def release(self):
+        '''Release the slot without reading the array
+        '''
+        shm = shared_memory.SharedMemory(name=self.name)
+        shm.buf[0] = FREE
+        shm.close()
+
+    def load(self, fun=None):
+        '''Return fun applied to the shared array and release the slot
+
+        Parameters
+        ----------
+        fun: function applied to the array, default to np.copy. Its
+            result should not reference the slot memory.
+        '''
+        if fun is None:
+            fun = np.copy
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            arr = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf,
+                             offset=self.offset)
+            res = fun(arr)
+            if isinstance(res, np.ndarray) and np.shares_memory(res, arr):
+                res = np.copy(res)
+            del arr
+            shm.buf[0] = FREE
+        finally:
+            shm.close()
+        return res
+
+
+class SharedArrayPool(object):
+    """Pool of shared memory slots used to send arrays to the handler
+
+    Parameters
+    ----------
+    n_slots: max # of slots, the arrays are pickled when all are in use
+    """
+    def __init__(self, n_slots=4):
+        self.n_slots = n_slots
+        self.slots = []
+
+    def put(self, arr):
+        '''Copy arr in a free slot and return its SharedArray descriptor
+
+        Return None if no slot is available.
+        '''
+        if arr.dtype.hasobject:
+            return None
+        size = arr.nbytes + HEADER
+        free = [shm for shm in self.slots if shm.buf[0] == FREE]
+        slot = None
+        for shm in free:
+            if shm.size >= size:
+                slot = shm
+                break
+        if slot is None:
+            if len(self.slots) >= self.n_slots:
+                if len(free) == 0:
+                    return None
+                # Replace the smallest free slot by a bigger one
+                self._remove(min(free, key=lambda shm: shm.size))
+            slot = shared_memory.SharedMemory(
+                create=True, size=1 << (size-1).bit_length())
+            self.slots.append(slot)
+
+        dst = np.ndarray(arr.shape, dtype=arr.dtype, buffer=slot.buf,
+                         offset=HEADER)
+        dst[...] = arr
+        del dst
+        slot.buf[0] = BUSY
+        return SharedArray(slot.name, arr.shape, arr.dtype.str)
+
+    def _remove(self, shm):
+        self.slots.remove(shm)
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self, wait=0):
+        '''Release all the slots, they should not be used anymore
+
+        Parameters
+        ----------
+        wait: max time (in s) to wait for the busy slots to be read
+        '''
+        t_end = time() + wait
+        while (time() < t_end and
+                any(shm.buf[0] == BUSY for shm in self.slots)):
+            sleep(.01)
+        for shm in list(self.slots):
+            self._remove(shm)
@@ -0,0 +1,85 @@
+import os
+import json
+import threading
+from time import monotonic
+from functools import wraps
+
+from . import SPAN
+
+
+class Span(object):
+    """Time a block of code or a function with begin/end SPAN records
+
+    Use it as a context manager or as a decorator. The records are only
+    sent if the level of the logger allows it when the span is entered,
+    so a disabled span costs a level check.
+
+    Parameters
+    ----------
+    logger: Logger sending the records
+    name: name of the span in the trace
+    levl: level of the records
+    args: optional arguments displayed with the span
+    """
+    __slots__ = ['logger', 'name', 'levl', 'args', 'active']
+
+    def __init__(self, logger, name, levl, args=None):
+        self.logger = logger
+        self.name = name
+        self.levl = levl
+        self.args = args
+        self.active = False
+
+    def __enter__(self):
+        if self.logger.level <= self.levl:
+            self.active = True
+            self._send('B')
+        return self
+
+    def __exit__(self, *exc):
+        if self.active:
+            self.active = False
+            self._send('E')
+        return False
+
+    def __call__(self, fun):
+        logger, name, levl, args = self.logger, self.name, self.levl, self.args
+
+        @wraps(fun)
+        def timed(*a, **kw):
+            with Span(logger, name, levl, args):
+                return fun(*a, **kw)
+        return timed
+
+    def _send(self, ph):
+        entry = dict(name=self.name, ph=ph, ts=monotonic(),
+                     pid=os.getpid(), tid=threading.get_ident(),
+                     cat=self.logger.name)
+        if self.args is not None and ph == 'B':
+            entry['args'] = self.args
+        self.logger._log((SPAN, self.levl, entry))
+
+
+def chrome_trace(spans, fname=None):
+    '''Return the spans as a Chrome trace-event dict
+
+    The result can be opened in chrome://tracing or in Perfetto.
+
+    Parameters
+    ----------
+    spans: list of the SPAN entries collected by the handler
+    fname: if not None, the trace is also written in this JSON file
+    '''
+    events = []
+    for s in spans:
+        event = dict(name=s['name'], ph=s['ph'], ts=s['ts']*1e6,
+                     pid=s['pid'], tid=s['tid'], cat=s.get('cat') or 'root')
+        if 'args' in s:
+            event['args'] = s['args']
+        events.append(event)
+    events.sort(key=lambda e: e['ts'])
+    res = dict(traceEvents=events, displayTimeUnit='ms')
+    if fname is not None:
+        with open(fname, 'w') as f:
+            json.dump(res, f, default=str)
+    return res
@@ -0,0 +1,168 @@
+import os
+import json
+import numpy as np
+from numpy.lib.format import open_memmap
+
+META = 'meta.json'
+INDEX = 'index.bin'
+CHUNK = 'chunk_{:05d}.npy'
+
+
+class SpilledTrajectory(object):
+    """Write a logged trajectory in chunked .npy files
+
+    The values are written in memory mapped .npy files of chunk_size rows
+    and the iterations/times are appended in a raw float64 index file.
+    The index is written after the value, so a reader only sees complete
+    rows and can follow the trajectory while it is written.
+
+    Parameters
+    ----------
+    path: directory of the trajectory
+    chunk_size: # of rows in each .npy file
+    """
+    def __init__(self, path, chunk_size=4096):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.chunk = None
+        self.shape = None
+        self.dtype = None
+        self.index = None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, value, iteration=np.nan, time=np.nan):
+        value = np.asarray(value)
+        if self.shape is None:
+            self._init(value)
+        elif value.shape != self.shape:
+            raise ValueError('Cannot spill {} with shape {}, expected {}'
+                             ''.format(self.path, value.shape, self.shape))
+        k = self.size % self.chunk_size
+        if k == 0:
+            self._next_chunk()
+        self.chunk[k] = value
+        self.index.write(np.array([iteration, time], dtype=np.float64
+                                  ).tobytes())
+        self.index.flush()
+        self.size += 1
+
+    def _init(self, value):
+        self.shape = value.shape
+        self.dtype = value.dtype
+        if self.dtype.kind in 'biu':
+            self.dtype = np.result_type(self.dtype, np.float64)
+        if self.dtype.hasobject:
+            raise ValueError('Cannot spill objects in {}'.format(self.path))
+        os.makedirs(self.path, exist_ok=True)
+        self.index = open(os.path.join(self.path, INDEX), 'wb')
+        with open(os.path.join(self.path, META), 'w') as f:
+            json.dump(dict(shape=self.shape, dtype=self.dtype.str,
+                           chunk_size=self.chunk_size), f)
+
+    def _next_chunk(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+        n_chunk = self.size // self.chunk_size
+        self.chunk = open_memmap(
+            os.path.join(self.path, CHUNK.format(n_chunk)), mode='w+',
+            dtype=self.dtype, shape=(self.chunk_size,)+self.shape)
+
+    def reader(self):
+        '''Return a TrajectoryReader on this trajectory'''
+        return TrajectoryReader(self.path)
+
+    def close(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+class TrajectoryReader(object):
+    """Lazy reader for a trajectory spilled on disk
+
+    The chunks are opened as read-only memmaps when they are accessed,
+    so histories bigger than the memory can be inspected.
+
+    Parameters
+    ----------
+    path: directory of the trajectory
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.chunk_size = meta['chunk_size']
+
+    def __repr__(self):
+        return 'TrajectoryReader({}, {} rows)'.format(self.path, len(self))
+
+    def __len__(self):
+        return os.path.getsize(os.path.join(self.path, INDEX)) // 16
+
+    def _index(self):
+        n = len(self)
+        if n == 0:
+            return np.empty((0, 2))
+        return np.memmap(os.path.join(self.path, INDEX), mode='r',
+                         dtype=np.float64, shape=(n, 2))
+
+    @property
+    def iterations(self):
+        return self._index()[:, 0]
+
+    @property
+    def times(self):
+        return self._index()[:, 1]
+
+    def chunk(self, k):
+        '''Return the valid rows of the k-th chunk as a memmap'''
+        n = len(self) - k*self.chunk_size
+        if n <= 0 or k < 0:
+            raise IndexError('No chunk {} in {}'.format(k, self.path))
+        mm = np.load(os.path.join(self.path, CHUNK.format(k)), mmap_mode='r')
+        return mm[:min(n, self.chunk_size)]
+
+    def chunks(self):
+        '''Iterate over the chunks of the trajectory'''
+        n_chunks = -(-len(self) // self.chunk_size)
+        for k in range(n_chunks):
+            yield self.chunk(k)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.values()[i]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('Index {} out of {} rows'.format(i, n))
+        return self.chunk(i // self.chunk_size)[i % self.chunk_size]
+
+    def values(self):
+        '''Load the whole trajectory in memory'''
+        chunks = list(self.chunks())
+        if len(chunks) == 0:
+            return np.empty((0,)+self.shape, dtype=self.dtype)
+        return np.concatenate(chunks)
+
+
+def open_trajectories(path):
+    '''Return a dict of TrajectoryReader for the trajectories in path
+
+    Parameters
+    ----------
+    path: spill_dir of the Handler
+    '''
+    res = {}
+    for name in sorted(os.listdir(path)):
+        if os.path.exists(os.path.join(path, name, META)):
+            res[name] = TrajectoryReader(os.path.join(path, name))
+    return res
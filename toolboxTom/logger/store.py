@@ -0,0 +1,150 @@
+import os
+import numpy as np
+
+from .spill import SpilledTrajectory, TrajectoryReader
+
+
+class Column(object):
+    """Append-only array with amortised growth
+
+    Parameters
+    ----------
+    capacity: initial # of rows
+    """
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.data = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, value):
+        value = np.asarray(value)
+        if self.data is None:
+            self.data = np.empty((self.capacity,)+value.shape,
+                                 dtype=value.dtype)
+        elif (value.shape != self.data.shape[1:] and
+                self.data.dtype != object):
+            self._to_object()
+        elif not np.can_cast(value.dtype, self.data.dtype):
+            self._resize(len(self.data),
+                         np.result_type(value.dtype, self.data.dtype))
+
+        if self.size == len(self.data):
+            self._resize(2*self.size)
+        self.data[self.size] = value
+        self.size += 1
+
+    def values(self):
+        '''Return a view on the stored rows'''
+        if self.data is None:
+            return np.empty(0)
+        return self.data[:self.size]
+
+    def _resize(self, capacity, dtype=None):
+        if dtype is None:
+            dtype = self.data.dtype
+        data = np.empty((capacity,)+self.data.shape[1:], dtype=dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    def _to_object(self):
+        '''Switch to a column of objects when the rows change shape'''
+        data = np.empty(len(self.data), dtype=object)
+        for i in range(self.size):
+            data[i] = self.data[i]
+        self.data = data
+
+
+class Trajectory(object):
+    """In memory trajectory, with columns for values, iterations and times
+    """
+    def __init__(self):
+        self.obj = Column()
+        self.it = Column()
+        self.t = Column()
+
+    def __len__(self):
+        return len(self.obj)
+
+    def append(self, value, iteration=np.nan, time=np.nan):
+        self.obj.append(value)
+        self.it.append(iteration)
+        self.t.append(time)
+
+    def close(self):
+        pass
+
+
+class TrajectoryStore(object):
+    """Store the trajectories logged with log_obj
+
+    Each name holds a column for the logged values and two float columns
+    for the iteration and the time, set to nan when they are not given.
+    With spill_dir, the trajectories are written on disk in chunked .npy
+    files, one directory per name, and only their readers are returned.
+
+    Parameters
+    ----------
+    spill_dir: directory where the trajectories are spilled, if not None
+    chunk_size: # of rows in each spilled file
+    """
+    def __init__(self, spill_dir=None, chunk_size=4096):
+        self.spill_dir = spill_dir
+        self.chunk_size = chunk_size
+        self.trajectories = {}
+
+    def __contains__(self, name):
+        return name in self.trajectories
+
+    def __len__(self):
+        return len(self.trajectories)
+
+    def append(self, name, value, iteration=None, time=None):
+        traj = self.trajectories.get(name)
+        if traj is None:
+            if self.spill_dir is None:
+                traj = Trajectory()
+            else:
+                path = os.path.join(self.spill_dir,
+                                    str(name).replace(os.sep, '_'))
+                traj = SpilledTrajectory(path, self.chunk_size)
+            self.trajectories[name] = traj
+        traj.append(value, np.nan if iteration is None else float(iteration),
+                    np.nan if time is None else float(time))
+
+    def get(self, name):
+        '''Return the values, iterations and times logged for name
+
+        The values of a spilled trajectory are a lazy TrajectoryReader.
+        '''
+        traj = self.trajectories[name]
+        if isinstance(traj, SpilledTrajectory):
+            reader = traj.reader()
+            return reader, np.array(reader.iterations), np.array(reader.times)
+        return traj.obj.values(), traj.it.values(), traj.t.values()
+
+    def snapshot(self, name=None):
+        '''Return a dict with the values, iterations and times
+
+        The keys are name, name+'_i' and name+'_t' for each trajectory.
+
+        Parameters
+        ----------
+        name: only return this trajectory, default to all of them
+        '''
+        names = list(self.trajectories.keys())
+        if name is not None:
+            names = [name] if name in self.trajectories else []
+        res = {}
+        for n in names:
+            obj, it, t = self.get(n)
+            res[n] = obj if isinstance(obj, TrajectoryReader) else np.copy(obj)
+            res[n+'_i'] = np.copy(it)
+            res[n+'_t'] = np.copy(t)
+        return res
+
+    def close(self):
+        for traj in self.trajectories.values():
+            traj.close()
@@ -1,4 +1,4 @@
-from toolboxTom.logger import Logger
+from toolboxTom.logger import Logger, PROGRESS, LOG
 
 
 def test_graphical_logging():
@@ -36,3 +36,379 @@ def test_level():
     log.process_queue()
     log.end()
 
+
+
+def test_batching():
+    Logger.configure(batch_size=5, batch_delay=10)
+    try:
+        log = Logger(levl=10)
+        for i in range(11):
+            log.debug('record', i)
+        assert len(Logger._buffer) == 2
+        log.process_queue()
+        assert len(Logger._buffer) == 0
+        log.end()
+    finally:
+        Logger.configure(batch_size=256, batch_delay=0.05)
+
+
+def test_log_obj_local_fun():
+    import numpy as np
+
+    class Heavy(object):
+        def __init__(self):
+            self.A = np.ones((100, 100))
+
+        def cost(self, pt):
+            return np.sum(self.A.dot(pt))
+
+    heavy = Heavy()
+    log = Logger(levl=10)
+    Logger.configure(batch_size=1000, batch_delay=10)
+    try:
+        pt = np.ones(100)
+        log.log_obj(name='cost', obj=pt, fun=heavy.cost, iteration=1)
+        log.log_obj(name='pt', obj=pt, iteration=1)
+        pt[:] = 0
+        entry_cost, entry_pt = [r[2] for r in Logger._buffer[-2:]]
+        assert 'fun' not in entry_cost
+        assert entry_cost['obj'] == 10000
+        assert np.all(entry_pt['obj'] == 1)
+    finally:
+        Logger.configure(batch_size=256, batch_delay=0.05)
+    log.end()
+
+
+def test_shared_array():
+    import numpy as np
+    from toolboxTom.logger.shared_array import SharedArrayPool
+
+    pool = SharedArrayPool(n_slots=1)
+    try:
+        x = np.random.random((100, 50))
+        shared = pool.put(x)
+        assert pool.put(x) is None
+        assert np.all(shared.load() == x)
+        assert shared.load(np.sum) == np.sum(x)
+        assert pool.put(np.r_[x.ravel(), x.ravel()]) is not None
+    finally:
+        pool.close()
+
+
+def test_log_obj_shared():
+    import numpy as np
+    log = Logger(levl=10)
+    for i in range(20):
+        log.log_obj(name='pt', obj=np.ones(100000)*i, iteration=i)
+    objs = log.get_objects('pt')
+    assert objs['pt'].shape == (20, 100000)
+    assert np.all(objs['pt'][:, 0] == np.arange(20))
+    assert np.all(objs['pt_i'] == np.arange(20))
+    log.end()
+
+
+def test_trajectory_store():
+    import numpy as np
+    from toolboxTom.logger.store import TrajectoryStore
+
+    store = TrajectoryStore()
+    for i in range(100):
+        store.append('cost', i, iteration=i)
+        store.append('pt', np.ones(3)*i, time=i)
+    store.append('cost', .5)
+    obj, it, t = store.get('cost')
+    assert obj.dtype == float and len(obj) == 101
+    assert np.all(it[:100] == np.arange(100)) and np.isnan(t).all()
+    assert store.get('pt')[0].shape == (100, 3)
+    store.append('pt', np.ones(4))
+    assert store.snapshot('pt')['pt'].shape == (101,)
+
+
+def test_spill(tmp_path):
+    import numpy as np
+    from toolboxTom.logger.spill import SpilledTrajectory, open_trajectories
+
+    traj = SpilledTrajectory(str(tmp_path / 'pt'), chunk_size=7)
+    for i in range(20):
+        traj.append(np.ones(3)*i, iteration=i)
+    readers = open_trajectories(str(tmp_path))
+    reader = readers['pt']
+    assert len(reader) == 20
+    assert len(list(reader.chunks())) == 3
+    assert np.all(reader[15] == 15) and np.all(reader[-1] == 19)
+    assert np.all(reader.values()[:, 0] == np.arange(20))
+    assert np.all(reader.iterations == np.arange(20))
+    traj.append(np.ones(3)*20)
+    traj.close()
+    assert len(reader) == 21 and np.isnan(reader.times).all()
+
+
+def test_progress_throttling():
+    Logger.configure(batch_size=100000, batch_delay=10)
+    try:
+        log = Logger(levl=10)
+        Logger.flush()
+        i_max = 100000
+        for i in range(i_max+1):
+            log.progress(name='tight', iteration=i, i_max=i_max)
+        sent = [r[2]['iteration'] for r in Logger._buffer
+                if r[0] == PROGRESS]
+        assert sent[0] == 0 and sent[-1] == i_max
+        assert len(sent) < 100
+    finally:
+        Logger.configure(batch_size=256, batch_delay=0.05)
+    log.process_queue()
+    log.end()
+
+
+def test_headless_graph(tmp_path):
+    import os
+    Logger.configure(graph_dir=str(tmp_path), graph_format='svg')
+    try:
+        log = Logger(levl=10)
+        for i in range(100):
+            log.graphical_cost(name='Headless', cost=1/(i+1), iteration=i+1)
+        log.graphical_cost(name='Headless', end=True)
+        log.end()
+    finally:
+        Logger.handler_params.clear()
+    assert os.path.exists(os.path.join(str(tmp_path), 'Headless.svg'))
+
+
+def test_curve_decimation():
+    import numpy as np
+    from toolboxTom.logger.graph import Curve
+
+    curve = Curve(n_points=100)
+    y = np.random.random(10001)
+    for i in range(10000, -1, -1):
+        curve.append(i, y[i])
+    x_disp, y_disp = curve.display()
+    assert len(x_disp) <= 102
+    assert np.all(np.diff(x_disp) > 0)
+    assert y_disp.min() == y.min() and y_disp.max() == y.max()
+    assert x_disp[0] == 0 and x_disp[-1] == 10000
+
+
+def test_overflow_policies():
+    from queue import Queue
+    from threading import Timer
+    from toolboxTom.logger import LOG, LEVEL
+
+    try:
+        Logger.dropped.clear()
+        Logger.configure(overflow='drop-oldest')
+        qin = Queue(1)
+        Logger._put(qin, [(LOG, 20, 'msg', ''), (LEVEL, 10, None, '')])
+        Logger._put(qin, [(LOG, 30, 'msg', '')])
+        assert [r[1] for r in qin.get()[2]] == [10, 30]
+        assert Logger.dropped[LOG] == 1
+
+        Logger.configure(overflow='drop-level', drop_level=20)
+        qin.put(None)
+        Logger._put(qin, [(LOG, 10, 'msg', ''), (LOG, 20, 'msg', '')])
+        assert Logger.dropped[LOG] == 3
+
+        Logger.configure(overflow='sample', sample_rate=4)
+        consumer = Timer(.1, qin.get)
+        consumer.start()
+        Logger._put(qin, [(LOG, 20, 'msg', '')]*40 + [(LOG, 30, 'msg', '')])
+        consumer.join()
+        assert len(qin.get()[2]) == 11
+        assert Logger.dropped[LOG] == 3 + 30
+    finally:
+        Logger.configure(overflow='block', drop_level=10, sample_rate=10)
+        Logger.dropped.clear()
+
+
+def test_lazy_start():
+    log = Logger(levl=10)
+    log.process_queue()
+    assert not Logger._running()
+    log.set_level(20)
+    log.debug('Do not appear!!')
+    log.process_queue()
+    assert not Logger._running()
+    log.info('Start the handler')
+    log.process_queue()
+    assert Logger._running()
+    log.end()
+
+
+def test_no_flusher_at_import():
+    import os
+    import sys
+    import subprocess
+    import toolboxTom
+    # Logger('_GD', 10) only sets its level at import
+    code = ('import threading, toolboxTom.optim._alternate_descent; '
+            'print([t.name for t in threading.enumerate()])')
+    root = os.path.dirname(os.path.dirname(toolboxTom.__file__))
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    assert b'Log_flush' not in out
+
+
+def test_thread_backend():
+    import numpy as np
+    from toolboxTom.logger.handler_p import ThreadHandler
+
+    import logging
+    root = logging.getLogger()
+    root_handlers, root_level = list(root.handlers), root.level
+    Logger.configure(backend='thread')
+    try:
+        log = Logger(levl=10)
+        log.info('In a thread')
+        log.get_metrics()
+        # The logging of the host application is not changed
+        assert root.handlers == root_handlers and root.level == root_level
+        for i in range(10):
+            log.log_obj(name='pt', obj=np.ones(100000)*i, iteration=i)
+        objs = log.get_objects('pt')
+        assert isinstance(Logger.output, ThreadHandler)
+        assert np.all(objs['pt'][:, 0] == np.arange(10))
+        log.end()
+    finally:
+        Logger.configure(backend='process')
+
+
+def _worker(collector, wid):
+    Logger.attach(collector, wid)
+    log = Logger('worker', levl=10)
+    for i in range(10):
+        log.progress(name='work', iteration=i+1, i_max=10)
+    log.log_obj(name='wid', obj=wid)
+    log.end()
+
+
+def test_collector(tmp_path, monkeypatch):
+    import numpy as np
+    from multiprocessing import Process
+    from toolboxTom.logger import handler_p
+
+    # The handler process draws the progress in this file
+    fname = str(tmp_path / 'out.txt')
+    monkeypatch.setattr(handler_p, 'out', open(fname, 'w'))
+
+    log = Logger(levl=10)
+    collector = Logger.collector()
+    workers = [Process(target=_worker, args=(collector, i))
+               for i in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert np.all(np.sort(log.get_objects('wid')['wid']) == np.arange(4))
+    assert Logger._running()
+    log.end()
+    # The progress of the 4 workers is merged in a single line
+    with open(fname) as f:
+        done = [line for line in f if 'worker - work - Done' in line]
+    assert len(done) == 1
+    assert 'Done   40 iterations' in done[0]
+
+
+def test_trace_replay(tmp_path):
+    import numpy as np
+    from toolboxTom.logger.trace import TraceReader, replay
+
+    fname = str(tmp_path / 'run.trace')
+    Logger.configure(trace=fname)
+    try:
+        log = Logger(levl=10)
+        log.info('traced')
+        for i in range(50):
+            log.graphical_cost(name='Replay', cost=1/(i+1), iteration=i+1)
+            log.log_obj(name='pt', obj=np.ones(100000)*i, iteration=i)
+        log.log_obj(name='meta', obj={'i': 1})
+        log.end()
+    finally:
+        Logger.handler_params.clear()
+    logs = [r[2] for r in TraceReader(fname) if r[0] == LOG]
+    assert logs == ['traced']
+    curves, log_objects = replay(fname, graph_dir=str(tmp_path))
+    x, y = curves['Replay']['cost'].display()
+    assert np.all(x == np.arange(1, 51)) and y[-1] == 1/50
+    pt, it, _ = log_objects.get('pt')
+    assert pt.shape == (50, 100000) and np.all(pt[:, 0] == it)
+    assert log_objects.get('meta')[0][0] == {'i': 1}
+    assert (tmp_path / 'Replay.png').exists()
+
+
+def test_span(tmp_path):
+    import json
+
+    fname = str(tmp_path / 'spans.json')
+    Logger.configure(chrome_trace=fname)
+    try:
+        log = Logger('span', levl=10)
+
+        @log.span('decorated', levl=20)
+        def fun():
+            with log.span('inner', i=1):
+                pass
+        fun()
+        with log.span('disabled', levl=5):
+            pass
+        log.end()
+    finally:
+        Logger.handler_params.clear()
+    with open(fname) as f:
+        events = json.load(f)['traceEvents']
+    assert [(e['name'], e['ph']) for e in events] == [
+        ('decorated', 'B'), ('inner', 'B'), ('inner', 'E'),
+        ('decorated', 'E')]
+    assert events[1]['args'] == {'i': 1} and events[0]['cat'] == 'span'
+    assert events[0]['ts'] <= events[1]['ts'] <= events[3]['ts']
+
+
+def test_metrics(capsys):
+    Logger.configure(metrics=True)
+    try:
+        Logger.enqueued.clear()
+        log = Logger(levl=10)
+        for i in range(100):
+            log.progress(name='metrics', iteration=i+1, i_max=100)
+            log.info('record', i)
+        metrics = log.get_metrics()
+        assert metrics['enqueued']['LOG'] == 100
+        assert metrics['handled']['LOG'] == 100
+        assert metrics['queue_max'] >= 1
+        assert sum(metrics['latency']) == sum(metrics['handled'].values())
+        log.end()
+    finally:
+        Logger.configure(metrics=False)
+        Logger.enqueued.clear()
+    assert 'Logging metrics' in capsys.readouterr().out
+
+
+def test_progress_renderer():
+    from io import StringIO
+    from toolboxTom.logger.progress import ProgressRenderer
+
+    out = StringIO()
+    bars = ProgressRenderer(out, fps=1000)
+    bars.live = True
+    bars.update('outer', 1, 2)
+    bars.update('inner', 5, 10)
+    bars.render()
+    assert bars.n_lines == 2 and 'inner -  50.00%' in out.getvalue()
+    bars.update('inner', 10, 10)
+    bars.clear()
+    assert bars.n_lines == 0
+    bars.close()
+    lines = out.getvalue().split('\n')
+    assert 'inner - Done' in lines[-3] and 'outer -  50.00%' in lines[-2]
+
+
+def test_unused_logger_reference():
+    # A Logger created at import and never used does not keep the
+    # handler alive
+    unused = Logger('unused', levl=10)
+    log = Logger(levl=10)
+    log.info('record')
+    log.get_metrics()
+    assert Logger._running()
+    log.end()
+    assert not Logger._running()
+    unused.end()
@@ -0,0 +1,315 @@
+import os
+import sys
+import struct
+import pickle
+import numpy as np
+
+from . import STOP, LOG, PROGRESS, COST, OBJ, LEVEL, SPAN
+from .store import TrajectoryStore
+from .graph import Curve
+from .span import chrome_trace
+
+# The file starts with MAGIC, the format version and the start time. Each
+# record is a fixed RECORD header (action, level, worker id, time, size of
+# the payload) followed by its payload of typed fields.
+MAGIC = b'TBXTRACE'
+VERSION = 1
+HEADER = struct.Struct('<8sHd')
+RECORD = struct.Struct('<Bhhdi')
+
+# Field types of the payload
+T_NONE = 0
+T_BOOL = 1
+T_INT = 2
+T_FLOAT = 3
+T_STR = 4
+T_ARRAY = 5
+T_DICT = 6
+T_PICKLE = 7
+
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_SIZE = struct.Struct('<I')
+
+
+def _pack(value, out):
+    '''Append the typed encoding of value to the bytearray out'''
+    if value is None:
+        out.append(T_NONE)
+    elif isinstance(value, (bool, np.bool_)):
+        out.append(T_BOOL)
+        out.append(bool(value))
+    elif isinstance(value, (int, np.integer)) and -2**63 <= value < 2**63:
+        out.append(T_INT)
+        out += _INT.pack(int(value))
+    elif isinstance(value, (float, np.floating)):
+        out.append(T_FLOAT)
+        out += _FLOAT.pack(float(value))
+    elif isinstance(value, str):
+        value = value.encode('utf8')
+        out.append(T_STR)
+        out += _SIZE.pack(len(value))
+        out += value
+    elif isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        dtype = value.dtype.str.encode()
+        out.append(T_ARRAY)
+        out.append(len(dtype))
+        out += dtype
+        out.append(value.ndim)
+        out += struct.pack('<{}q'.format(value.ndim), *value.shape)
+        out += _SIZE.pack(value.nbytes)
+        out += np.ascontiguousarray(value).tobytes()
+    elif isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        out.append(T_DICT)
+        out += _SIZE.pack(len(value))
+        for k, v in value.items():
+            _pack(k, out)
+            _pack(v, out)
+    else:
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        out.append(T_PICKLE)
+        out += _SIZE.pack(len(value))
+        out += value
+
+
+def _unpack(buf, pos):
+    '''Return the value encoded at pos in buf and the next position'''
+    tag = buf[pos]
+    pos += 1
+    if tag == T_NONE:
+        return None, pos
+    elif tag == T_BOOL:
+        return bool(buf[pos]), pos+1
+    elif tag == T_INT:
+        return _INT.unpack_from(buf, pos)[0], pos+_INT.size
+    elif tag == T_FLOAT:
+        return _FLOAT.unpack_from(buf, pos)[0], pos+_FLOAT.size
+    elif tag == T_STR:
+        n = _SIZE.unpack_from(buf, pos)[0]
+        pos += _SIZE.size
+        return bytes(buf[pos:pos+n]).decode('utf8'), pos+n
+    elif tag == T_ARRAY:
+        n = buf[pos]
+        dtype = np.dtype(bytes(buf[pos+1:pos+1+n]).decode())
+        pos += 1+n
+        ndim = buf[pos]
+        shape = struct.unpack_from('<{}q'.format(ndim), buf, pos+1)
+        pos += 1+8*ndim
+        n = _SIZE.unpack_from(buf, pos)[0]
+        pos += _SIZE.size
+        arr = np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape)),
+                            offset=pos).reshape(shape)
+        return arr, pos+n
+    elif tag == T_DICT:
+        n = _SIZE.unpack_from(buf, pos)[0]
+        pos += _SIZE.size
+        res = {}
+        for _ in range(n):
+            k, pos = _unpack(buf, pos)
+            res[k], pos = _unpack(buf, pos)
+        return res, pos
+    elif tag == T_PICKLE:
+        n = _SIZE.unpack_from(buf, pos)[0]
+        pos += _SIZE.size
+        return pickle.loads(buf[pos:pos+n]), pos+n
+    raise ValueError('Unknown field type {} in trace'.format(tag))
+
+
+class TraceWriter(object):
+    """Append the handled records to a binary trace file
+
+    The records are written in a buffered file, with their level, the id
+    of the worker which sent them and the time they were handled. The
+    arrays are stored raw and the other objects are pickled.
+
+    Parameters
+    ----------
+    path: name of the trace file, overwritten if it exists
+    """
+    def __init__(self, path, t_start=None):
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname != '':
+            os.makedirs(dirname, exist_ok=True)
+        self.t_start = t_start
+        self.f = open(path, 'wb', buffering=1 << 16)
+        self.f.write(HEADER.pack(MAGIC, VERSION, np.nan if t_start is None
+                                 else t_start))
+        self.n_records = 0
+
+    def write(self, action, levl, entry, wid=None, t=np.nan):
+        record = bytearray(RECORD.size)
+        _pack(entry, record)
+        RECORD.pack_into(record, 0, action, -1 if levl is None else levl,
+                         -1 if wid is None else wid, t,
+                         len(record) - RECORD.size)
+        self.f.write(record)
+        self.n_records += 1
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class TraceReader(object):
+    """Iterate over the records of a binary trace file
+
+    Each record is a tuple (action, levl, entry, wid, t), with None for a
+    missing level or worker id. The arrays are read-only views on the
+    memory mapped file. A truncated last record is ignored, so a trace can
+    be read while it is written.
+
+    Parameters
+    ----------
+    path: name of the trace file
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('{} is not a trace file'.format(path))
+        magic, self.version, self.t_start = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('{} is not a trace file'.format(path))
+        if self.version > VERSION:
+            raise ValueError('Trace version {} of {} is not supported'
+                             ''.format(self.version, path))
+
+    def __iter__(self):
+        size = os.path.getsize(self.path)
+        if size <= HEADER.size:
+            return
+        buf = memoryview(np.memmap(self.path, mode='r', dtype=np.uint8))
+        pos = HEADER.size
+        while pos + RECORD.size <= size:
+            action, levl, wid, t, n = RECORD.unpack_from(buf, pos)
+            pos += RECORD.size
+            if pos + n > size:
+                break
+            entry = _unpack(buf, pos)[0]
+            pos += n
+            yield (action, None if levl == -1 else levl, entry,
+                   None if wid == -1 else wid, t)
+
+
+def replay(path, graph_dir=None, graph_format='png', n_points=2000):
+    '''Rebuild the cost curves and the trajectories of a trace file
+
+    Parameters
+    ----------
+    path: name of the trace file
+    graph_dir: if not None, save the figures of the curves in this
+        directory as name.graph_format files
+    n_points: max # of points displayed for each curve
+
+    Return
+    ------
+    curves: dict {name: {curve: Curve}} of the graphical_cost curves
+    log_objects: TrajectoryStore with the objects logged with log_obj
+    '''
+    curves = {}
+    ended = set()
+    log_objects = TrajectoryStore()
+
+    def add_cost(cost=1, iteration=None, name='Cost', curve='cost',
+                 end=False, **kwargs):
+        # As in the handler, the points after an end start a new curve
+        if end:
+            ended.add((name, curve))
+            return
+        c = curves.setdefault(name, {}).get(curve)
+        if c is None or (name, curve) in ended:
+            ended.discard((name, curve))
+            c = curves[name][curve] = Curve(n_points)
+            iteration = 1 if iteration is None else iteration
+        elif iteration is None:
+            iteration = c.x_last+1
+        c.append(iteration, cost)
+
+    for action, levl, entry, wid, t in TraceReader(path):
+        if action == COST:
+            add_cost(**entry)
+        elif action == OBJ:
+            log_objects.append(entry['name'], np.array(entry['obj']),
+                               iteration=entry.get('iteration'),
+                               time=entry.get('time'))
+            graph_cost = entry.get('graph_cost')
+            if graph_cost is not None:
+                graph_cost.update(iteration=entry.get('iteration'))
+                add_cost(cost=entry['obj'], **graph_cost)
+
+    if graph_dir is not None:
+        save_curves(curves, graph_dir, graph_format)
+    return curves, log_objects
+
+
+def save_curves(curves, graph_dir, graph_format='png'):
+    '''Save the curves returned by replay as name.graph_format files
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    os.makedirs(graph_dir, exist_ok=True)
+    for name, lines in curves.items():
+        fig = plt.figure(name)
+        for curve, c in lines.items():
+            plt.loglog(*c.display(), label=curve)
+        plt.legend()
+        fname = '{}.{}'.format(str(name).replace(os.sep, '_'), graph_format)
+        fig.savefig(os.path.join(graph_dir, fname))
+        plt.close(fig)
+
+
+def dump(path, out=sys.stdout):
+    '''Print the LOG, PROGRESS and LEVEL records of a trace file'''
+    for action, levl, entry, wid, t in TraceReader(path):
+        prefix = '{:.3f} '.format(t)
+        if wid is not None:
+            prefix += 'Worker {} - '.format(wid)
+        if action == LOG:
+            out.write('{}{} - {}\n'.format(prefix, levl, entry))
+        elif action == PROGRESS:
+            out.write('{}{} - {}/{}\n'.format(prefix, entry.get('name'),
+                                              entry.get('iteration'),
+                                              entry.get('i_max')))
+        elif action == LEVEL:
+            out.write('{}Set level {}\n'.format(prefix, levl))
+        elif action == STOP:
+            out.write('{}Stop\n'.format(prefix))
+
+
+def main(argv=None):
+    '''Replay the trace file given in the command line'''
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Replay a trace file written by the logging handler')
+    parser.add_argument('trace', help='trace file')
+    parser.add_argument('--graph-dir', default=None,
+                        help='save the cost curves in this directory')
+    parser.add_argument('--format', default='png',
+                        help='format of the saved curves')
+    parser.add_argument('--log', action='store_true',
+                        help='print the logged messages')
+    parser.add_argument('--chrome', default=None,
+                        help='export the spans in this Chrome trace file')
+    args = parser.parse_args(argv)
+
+    if args.chrome is not None:
+        chrome_trace([r[2] for r in TraceReader(args.trace)
+                      if r[0] == SPAN], args.chrome)
+
+    if args.log:
+        dump(args.trace)
+    curves, log_objects = replay(args.trace, args.graph_dir, args.format)
+    for name, lines in curves.items():
+        for curve, c in lines.items():
+            print('{} - {}: {} points'.format(name, curve, len(c)))
+    for name in log_objects.trajectories:
+        obj, it, t = log_objects.get(name)
+        print('{}: {} objects'.format(name, len(obj)))
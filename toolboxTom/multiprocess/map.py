@@ -8,19 +8,24 @@ log.set_level(0)
 
 
 class WorkerGroups(Process):
-    def __init__(self, qin, qout, fun, id_w=0, **kwargs):
+    def __init__(self, qin, qout, fun, id_w=0, collector=None, debug=0,
+                 **kwargs):
         super(WorkerGroups, self).__init__(name='Worker n°{}'.format(id_w))
         self.qin = qin
         self.qout = qout
         self.id = id_w
         self.fun = fun
+        self.collector = collector
+        self.debug = debug
         self.args = kwargs
 
     def run(self):
+        Logger.attach(self.collector, self.id)
         idp, p = self.qin.get()
         while idp is not None:
-            log.debug('Worker {} - |qin| = {}'
-                      ''.format(self.id, self.qin.qsize()))
+            if self.debug:
+                log.debug('Worker {} - |qin| = {}'
+                          ''.format(self.id, self.qin.qsize()))
             params = dict(p=p, **self.args)
             try:
                 self.qout.put((idp, self.fun(**params)))
@@ -29,11 +34,17 @@ class WorkerGroups(Process):
                 msg = traceback.format_exc()
                 print(msg)
             idp, p = self.qin.get()
-        log.debug('Worker {} finished'.format(self.id))
+        if self.debug:
+            log.debug('Worker {} finished'.format(self.id))
         return 0
 
 
-def map_grouping(fun, l1, njobs=0, **kwargs):
+def map_grouping(fun, l1, njobs=0, debug=0, **kwargs):
+    '''Return [fun(p=p, **kwargs) for p in l1], computed by njobs workers
+
+    With debug, the workers log their progress in the log handler of
+    this process.
+    '''
 
     if njobs < 1:
         cc = multiprocessing.cpu_count()
@@ -48,11 +59,15 @@ def map_grouping(fun, l1, njobs=0, **kwargs):
     for k, p in enumerate(l1):
         qin.put((k, p))
 
+    slaves = []
     try:
-        slaves = []
+        # The workers which log report to our log handler
+        collector = Logger.collector() if debug else None
         for i in range(njobs):
             qin.put((None, None))
-            slaves += [WorkerGroups(qin, qout, fun, id_w=i, **kwargs)]
+            slaves += [WorkerGroups(qin, qout, fun, id_w=i,
+                                    collector=collector, debug=debug,
+                                    **kwargs)]
             slaves[-1].start()
         print(qin.qsize())
 
@@ -1,4 +1,3 @@
-import numpy as np
 from math import sqrt
 from time import time
 
@@ -117,7 +116,7 @@ class _AlternateDescent(object):
         self.t_start = time()
         self._init_algo()
         if self.logging:
-            log.log_obj(name='cost'+str(self.id), obj=np.copy(self.pt),
+            log.log_obj(name='cost'+str(self.id), obj=self.pt,
                         iteration=self.iteration+1, fun=self.pb.cost,
                         graph_cost=self.graph_cost, time=time()-self.t_start)
 
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from math import sqrt
 from time import time
@@ -6,17 +7,27 @@ from ..logger import Logger
 log = Logger('GD')
 
 from . import get_log_rate
+from .stopping import get_stopping
 
 
 class _GradientDescent(object):
     """Class to hold gradient descent properties"""
 
     id_gd = 0
+    # Attributes saved in the checkpoints with the point of the problem,
+    # extended by the subclasses with their momentum
+    _state = ('iteration', 't', 'alpha', 'L', 'f_pt', 'finished',
+              'stop_reason')
+    # Applications of the operator of the problem for an iteration, the
+    # cost unit of the checks of the stopping rules
+    n_ops = 2
 
     def __init__(self, problem, decreasing_rate='sqrt',
                  stop='', tol=1e-10, graphical_cost=None,
                  name=None, debug=0, logging=False,
-                 log_rate='log1.6', i_max=1e6, t_max=40):
+                 log_rate='log1.6', i_max=1e6, t_max=40,
+                 line_search=False, eta=2, shrink=.9,
+                 checkpoint=None, checkpoint_every=60, resume=True):
         '''Gradient Descent handeler
 
         Parameters
@@ -27,6 +38,20 @@ class _GradientDescent(object):
             given the current parameters
         decreasing_rate: {'sqrt', 'linear'} deacreasing rate
             for the learning rate
+        stop: stopping rules, see stopping.get_stopping. The reason of
+            the stop is kept in stop_reason.
+        tol: tolerance of the stopping rules given by name
+        line_search: if True, the learning rate is 1/L with L estimated
+            by backtracking, starting from problem.L. L is multiplied by
+            eta until the step is accepted, and by shrink after it.
+            decreasing_rate is not used with the line search.
+        checkpoint: file where the state of the solver is saved every
+            checkpoint_every seconds and when it finishes. If the file
+            exists and was saved for the same problem, see
+            _Problem.fingerprint, the solver restarts from it. Remove it
+            to solve the problem again.
+        resume: if False, the checkpoint is only saved, the solver starts
+            from the current point of the problem, e.g. a warm start.
         '''
         log.set_level(max(3-debug, 1)*10)
         debug = max(debug-1, 0)
@@ -35,10 +60,16 @@ class _GradientDescent(object):
         _GradientDescent.id_gd += 1
 
         self.pb = problem
+        self.alpha = 1 / problem.L
         self.decreasing_rate = decreasing_rate
         self.stop = stop
         self.tol = tol
 
+        # Backtracking line search
+        self.line_search = line_search
+        self.eta = eta
+        self.shrink = shrink
+
         # Logging system
         self.logging = logging
         self.log_rate = get_log_rate(log_rate)
@@ -48,6 +79,14 @@ class _GradientDescent(object):
         self.name = name if name is not None else '_GD' + str(self.id)
         self.graph_cost = None
 
+        # Checkpoints
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.resume = resume
+
+        # Work arrays of the iterations, see _buffer
+        self._buffers = {}
+
         self.reset()
 
     def set_param(self, decreasing_rate='sqrt',
@@ -96,11 +135,16 @@ class _GradientDescent(object):
             return True
         if self.iteration == 0:
             self.start()
+            if self.finished:
+                return True
         self.iteration += 1
         dz = self.p_update()
         self.t = time() - self.t_start
+        if (self.checkpoint is not None and
+                self.t - self.t_checkpoint >= self.checkpoint_every):
+            self.save(self.checkpoint)
         if self.iteration >= self.next_log and self.logging:
-            log.log_obj(name='cost' + str(self.id), obj=np.copy(self.pb.pt),
+            log.log_obj(name='cost' + str(self.id), obj=self.pb.pt,
                         iteration=self.iteration, fun=self.pb.cost,
                         graph_cost=self.graph_cost, time=self.t,
                         levl=50)
@@ -113,63 +157,138 @@ class _GradientDescent(object):
     def p_update(self):
         '''Update the parameters
         '''
-        grad = self.pb.grad(self.pb.pt)
+        grad = self._grad(self.pb.pt)
         self.p_grad = grad
+        if self.line_search:
+            pt = self.pb.pt
+            f_pt = self.f_pt
+            if f_pt is None:
+                f_pt = self._smooth_cost(pt)
+            new_pt = self._backtrack(pt, grad, f_pt, lambda lr: pt-lr*grad)
+            self.pb._update(new_pt)
+            return np.sum((new_pt-pt)**2)
         lr = self._get_lr()
-        self.pb -= lr*grad
-        return lr*np.sum(grad)
+        self.pb -= np.multiply(grad, lr, out=self._buffer('step'))
+        return lr*lr*np.vdot(grad, grad)
+
+    def _buffer(self, name):
+        '''Return the work array name, with the shape of the points
+
+        It is allocated once, so the iterations do not allocate memory,
+        and overwritten by each iteration.
+        '''
+        pt = self.pb.pt
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != pt.shape or buf.dtype != pt.dtype:
+            buf = self._buffers[name] = np.empty_like(pt)
+        return buf
+
+    def _grad(self, pt=None, name='grad'):
+        '''Gradient in pt, written in the work array name if the problem
+        supports it'''
+        if getattr(self.pb, 'inplace', False):
+            return self.pb.grad(pt, out=self._buffer(name))
+        return self.pb.grad(pt)
+
+    def _smooth_cost(self, pt):
+        '''Cost of the smooth part of the problem, used by the line search
+        '''
+        return self.pb.cost(pt)
+
+    def _backtrack(self, pt, grad, f_pt, step, max_backtrack=60):
+        '''Return the point step(lr) with the backtracking line search
+
+        The Lipschitz constant self.L is multiplied by eta until the new
+        point z = step(1/L) verifies the sufficient decrease condition
+            f(z) <= f(pt) + <grad, z-pt> + L/2*|z-pt|^2
+        and it is multiplied by shrink after, so it can decrease if the
+        problem is flatter. The smooth cost of the new point is kept in
+        self.f_pt, to be reused by the next iteration.
+
+        Parameters
+        ----------
+        pt: current point
+        grad: gradient of the smooth part in pt
+        f_pt: smooth cost in pt
+        step: function of the learning rate returning the new point
+        '''
+        for _ in range(max_backtrack):
+            self.alpha = 1 / self.L
+            z = step(self.alpha)
+            f_z = self._smooth_cost(z)
+            dz = z - pt
+            if (f_z <= f_pt + np.sum(grad*dz) + self.L/2*np.sum(dz*dz)
+                    + 1e-12*abs(f_pt)):
+                break
+            self.L *= self.eta
+        else:
+            log.warning('{} - Line search failed with L={:.3e}'
+                        ''.format(self.__repr__(), self.L))
+        self.f_pt = f_z
+        self.L *= self.shrink
+        self.alpha = 1 / self.L
+        return z
 
     def _get_lr(self):
         '''Auxillary funciton, return the learning rate
         '''
         lr = self.alpha
         if self.decreasing_rate == 'sqrt':
-            lr /= sqrt(self.iteration)
+            lr = lr / sqrt(self.iteration)
         elif self.decreasing_rate == 'linear':
-            lr /= self.iteration
+            lr = lr / self.iteration
         elif self.decreasing_rate == 'k2':
-            lr *= 2/(self.iteration+2)
+            lr = lr * 2/(self.iteration+2)
         elif hasattr(self.decreasing_rate, '__call__'):
-            lr *= self.decreasing_rate(self.iteration)
+            lr = lr * self.decreasing_rate(self.iteration)
         return lr
 
     def _stop(self, dz):
         '''Implement stopping criterion
+
+        dz is the squared norm of the last step.
         '''
 
         if self.iteration >= self.i_max or self.t >= self.t_max:
             self.finished = True
+            self.stop_reason = ('max_iter' if self.iteration >= self.i_max
+                                else 'timeout')
             log.info("{} - Stop - Reach timeout or maxiter"
                      "".format(self.__repr__()))
             return True
 
-        if self.stop == 'none':
-            return False
-
-        # If |x_n-x_n-1| < tol, stop
-        if dz < self.tol:
-            self.finished = True
-            log.info('{} - Stop - No advance X'.format(self.__repr__()))
-            return self.finished
-
-        # Other stopping criterion
-        if self.stop == 'up5':
-            return False
-        else:
-            return False
+        for rule in self.stopping:
+            if rule(self, dz):
+                self.finished = True
+                self.stop_reason = rule.name
+                log.info('{} - Stop - {} {:.3e}'.format(
+                    self.__repr__(), rule.name, rule.value))
+                return True
+        return False
 
     def start(self):
         log.info(self.__repr__(), 'Start')
         self.reset()
         self._init_algo()
+        if (self.checkpoint is not None and self.resume and
+                os.path.exists(self.checkpoint) and
+                self.load(self.checkpoint)):
+            log.info('{} - Restart from {} at iteration {}'.format(
+                self.__repr__(), self.checkpoint, self.iteration))
         if self.logging:
-            log.log_obj(name='cost'+str(self.id), obj=np.copy(self.pb.pt),
+            log.log_obj(name='cost'+str(self.id), obj=self.pb.pt,
                         iteration=0.7, fun=self.pb.cost,
                         graph_cost=self.graph_cost, time=time()-self.t_start)
         self.next_log = self.log_rate(self.iteration)
 
     def end(self):
         self.runtime = time()-self.t_start
+        if any(self.pb.pt is buf for buf in self._buffers.values()):
+            # The solution is given to the problem, the work arrays are
+            # overwritten by the next iterations
+            self.pb._update(np.copy(self.pb.pt))
+        if self.checkpoint is not None:
+            self.save(self.checkpoint)
         if self.logging:
             log.log_obj(name='cost'+str(self.id), obj=self.pb.pt,
                         iteration=self.iteration, fun=self.pb.cost,
@@ -184,10 +303,63 @@ class _GradientDescent(object):
         self.iteration = 0
         self.t_start = time()
         self.t = 0
+        if self.line_search:
+            # The estimate of L restarts from the problem constant
+            self.L = self.pb.L
+            self.alpha = 1 / self.L
+        self.f_pt = None
+        self.stop_reason = None
+        self.stopping = get_stopping(self.stop, self.tol)
+        for rule in self.stopping:
+            rule.reset(self)
+        self.t_checkpoint = 0
+
+    def save(self, fname):
+        '''Save the point of the problem and the state of the solver
+
+        The file is an npz archive, replaced atomically so an interrupted
+        save does not corrupt the last checkpoint.
+        '''
+        state = {name: getattr(self, name) for name in self._state
+                 if getattr(self, name, None) is not None}
+        tmp = fname + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, pt=self.pb.pt,
+                                fingerprint=self.pb.fingerprint(), **state)
+        os.replace(tmp, fname)
+        self.t_checkpoint = self.t
+
+    def load(self, fname):
+        '''Restore the point of the problem and the state of the solver
+        saved with save
+
+        Return False, without changing anything, if the checkpoint was
+        saved for another problem.
+        '''
+        with np.load(fname) as state:
+            state = dict(state)
+        fingerprint = state.pop('fingerprint', None)
+        if fingerprint is None or fingerprint.item() != self.pb.fingerprint():
+            log.warning('{} - The checkpoint {} was saved for another '
+                        'problem, it is ignored'.format(self.__repr__(),
+                                                        fname))
+            return False
+        self.pb._update(state.pop('pt'))
+        for name, value in state.items():
+            if value.ndim == 0:
+                value = value.item()
+            elif name == 'theta':
+                value = list(value)
+            setattr(self, name, value)
+        self.t_start = time() - self.t
+        self.t_checkpoint = self.t
+        self.next_log = self.log_rate(self.iteration)
+        return True
 
     def fit(self, pb):
         self.pb = pb
         self.reset()
         stop = False
-        while not stop:
-            stop = self.update()
+        with log.span(self.name + ' - fit'):
+            while not stop:
+                stop = self.update()
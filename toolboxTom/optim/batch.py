@@ -0,0 +1,250 @@
+import numpy as np
+
+from . import _GradientDescent
+from .problem import _Problem, ImplementationError
+from .lasso import soft_thresholding
+from toolboxTom.logger import Logger
+
+log = Logger(name='BatchDescent')
+
+
+class _BatchProblem(_Problem):
+    """Stack of n_problems problems solved together
+
+    The points of all the problems are stored in one (n_problems, ...)
+    array pt. The methods take the points of a subset rows of the
+    problems, a slice or an array of indices, so the gradients of the
+    unfinished problems are computed with matrix-matrix products.
+
+    Parameters
+    ----------
+    x0: (n_problems, ...) initial points
+    size: shape of pt if x0 is None
+    """
+    def __init__(self, x0=None, size=None):
+        super(_BatchProblem, self).__init__(x0=x0, size=size)
+        self.n_problems = self.sizes[0]
+
+    def costs(self, pt=None, rows=slice(None)):
+        '''Return the cost of each problem of rows'''
+        raise ImplementationError('costs not implemented', self.__class__)
+
+    def cost(self, pt=None):
+        '''Return the sum of the costs of all the problems'''
+        return np.sum(self.costs(pt))
+
+    def grad(self, pt=None, rows=slice(None)):
+        raise ImplementationError('grad not implemented', self.__class__)
+
+    def prox(self, pt=None, lmbd=None, rows=slice(None)):
+        raise ImplementationError('prox not implemented', self.__class__)
+
+    def rows(self, value):
+        '''Broadcast a scalar or a per problem value against pt'''
+        value = np.asarray(value, dtype=float)
+        value = np.broadcast_to(value.reshape(-1), (self.n_problems,))
+        return value.reshape((-1,)+(1,)*(len(self.sizes)-1)).copy()
+
+
+class BatchLasso(_BatchProblem):
+    """Lasso problems sharing the operator A, 1/2*|Ax_i-b_i|^2 + lmbd_i|x_i|_1
+
+    Parameters
+    ----------
+    A: (n_features, n_dims) shared operator
+    B: (n_problems, n_features) signals
+    lmbd: regularisation parameter, scalar or one per problem
+    """
+    def __init__(self, A, B, lmbd=.1, x0=None):
+        self.A = A
+        self.B = B
+        if x0 is None:
+            x0 = np.zeros((B.shape[0], A.shape[1]))
+        self.operator = A
+        super(BatchLasso, self).__init__(x0=x0)
+        self.lmbd = self.rows(lmbd)
+        self.L = 'auto'
+
+    @staticmethod
+    def from_problems(problems):
+        '''Stack Lasso problems sharing the same operator'''
+        A = problems[0].A
+        assert all(pb.A is A or np.array_equal(pb.A, A) for pb in problems), (
+            'The problems should share the same operator')
+        return BatchLasso(A, np.array([pb.b for pb in problems]),
+                          [pb.lmbd for pb in problems],
+                          x0=np.array([pb.pt for pb in problems]))
+
+    def residual(self, pt, rows=slice(None)):
+        return pt.dot(self.A.T) - self.B[rows]
+
+    def costs(self, pt=None, rows=slice(None)):
+        if pt is None:
+            pt = self.pt[rows]
+        res = self.residual(pt, rows)
+        return (0.5*np.sum(res*res, axis=1) +
+                self.lmbd[rows, 0]*np.sum(abs(pt), axis=1))
+
+    def grad(self, pt=None, rows=slice(None)):
+        if pt is None:
+            pt = self.pt[rows]
+        return self.residual(pt, rows).dot(self.A)
+
+    def prox(self, pt=None, lmbd=None, rows=slice(None)):
+        if pt is None:
+            pt = self.pt[rows]
+        if lmbd is None:
+            lmbd = self.lmbd[rows]
+        return soft_thresholding(pt, lmbd)
+
+
+class BatchGradientDescent(_GradientDescent):
+    """Gradient descent on all the problems of a _BatchProblem
+
+    Each problem has its own step size 1/L and is frozen when its point
+    moves less than tol, the solver stops when all of them are frozen.
+    The line search is not supported, as it would need one L per problem.
+    """
+    _state = _GradientDescent._state + ('active',)
+
+    def __init__(self, problem, decreasing_rate='', line_search=False,
+                 **kwargs):
+        if line_search:
+            raise ValueError('{} does not support the line search'
+                             ''.format(self.__class__.__name__))
+        super(BatchGradientDescent, self).__init__(
+            problem, decreasing_rate=decreasing_rate, **kwargs)
+        self.alpha = problem.rows(1/np.asarray(problem.L))
+        self.active = np.ones(problem.n_problems, dtype=bool)
+
+    def __repr__(self):
+        return 'Batch' + super(BatchGradientDescent, self).__repr__()
+
+    def _init_algo(self):
+        self.active = np.ones(self.pb.n_problems, dtype=bool)
+
+    def _rows(self):
+        '''Return the rows of the active problems'''
+        if self.active.all():
+            return slice(None)
+        return np.flatnonzero(self.active)
+
+    def _freeze(self, rows, pt, new_pt):
+        '''Set the new points of rows and freeze the converged problems
+
+        Return the max of the squared moves of the active problems.
+        '''
+        dz = new_pt - pt
+        dz = np.sum(dz.reshape(len(dz), -1)**2, axis=1)
+        self.pb[rows] = new_pt
+        if self.stop != 'none':
+            self.active[np.arange(self.pb.n_problems)[rows][dz < self.tol]] \
+                = False
+        return dz.max() if len(dz) > 0 else 0
+
+    def p_update(self):
+        rows = self._rows()
+        pt = self.pb.pt[rows]
+        grad = self.pb.grad(pt, rows)
+        lr = self._get_lr()[rows]
+        return self._freeze(rows, pt, pt - lr*grad)
+
+
+class BatchMomentGradientDescent(BatchGradientDescent):
+    """Batched gradient descent with moment update
+
+    With restart, the moment of a problem is reset when its cost
+    increases.
+    """
+    _state = BatchGradientDescent._state + ('p_grad', 'p_cost')
+
+    def __init__(self, problem, decreasing_rate='', alpha_moment=0.9,
+                 restart=True, **kwargs):
+        super(BatchMomentGradientDescent, self).__init__(
+            problem, decreasing_rate=decreasing_rate, **kwargs)
+        self.alpha_moment = alpha_moment
+        self.restart = restart
+
+    def _init_algo(self):
+        super(BatchMomentGradientDescent, self)._init_algo()
+        self.p_grad = np.zeros(self.pb.pt.shape)
+        self.p_cost = self.pb.costs(self.pb.pt)
+
+    def p_update(self):
+        rows = self._rows()
+        pt = self.pb.pt[rows]
+        grad = self.pb.grad(pt, rows)
+        lr = self._get_lr()[rows]
+        p_grad = grad + self.alpha_moment*self.p_grad[rows]
+        new_pt = pt - lr*p_grad
+        cost = self.pb.costs(new_pt, rows)
+        if self.restart:
+            up = cost > self.p_cost[rows]
+            if up.any():
+                p_grad[up] = grad[up]
+                new_pt[up] = pt[up] - lr[up]*grad[up]
+                cost[up] = self.pb.costs(new_pt[up], np.arange(
+                    self.pb.n_problems)[rows][up])
+        self.p_grad[rows] = p_grad
+        self.p_cost[rows] = cost
+        return self._freeze(rows, pt, new_pt)
+
+
+class BatchProximalDescent(BatchGradientDescent):
+    """Batched accelerated proximal gradient descent (FISTA)
+
+    Each problem has its own momentum sequence, reset when the problem
+    is restarted.
+    """
+    _state = BatchGradientDescent._state + ('p_grad', 'theta')
+
+    def __init__(self, problem, decreasing_rate='', f_theta='boyd',
+                 restart=False, **kwargs):
+        super(BatchProximalDescent, self).__init__(
+            problem, decreasing_rate=decreasing_rate, **kwargs)
+        self.f_theta = f_theta
+        self.restart = restart
+
+    def _init_algo(self):
+        super(BatchProximalDescent, self)._init_algo()
+        self.p_grad = np.zeros(self.pb.pt.shape)
+        theta = 1 - self.f_theta if type(self.f_theta) is float else 1
+        self.theta = [self.pb.rows(theta), self.pb.rows(theta)]
+
+    def p_update(self):
+        rows = self._rows()
+        pt = self.pb.pt[rows]
+        lr = self._get_lr()[rows]
+        lmbd = self.pb.lmbd[rows]
+        ak, ak1 = self.theta[0][rows], self.theta[1][rows]
+        yn = pt + ak*(1/ak1-1)*self.p_grad[rows]
+        grad = self.pb.grad(yn, rows)
+        new_pt = self.pb.prox(yn-lr*grad, lmbd*lr, rows)
+
+        if self.restart:
+            res_cond = np.sum((yn - new_pt)*(new_pt - pt), axis=tuple(
+                range(1, pt.ndim)))
+            up = res_cond > 0
+            if up.any():
+                log.debug('Restart {} problems'.format(up.sum()))
+                r_up = np.arange(self.pb.n_problems)[rows][up]
+                grad = self.pb.grad(pt[up], r_up)
+                new_pt[up] = self.pb.prox(pt[up]-lr[up]*grad,
+                                          lmbd[up]*lr[up], r_up)
+                ak = ak.copy()
+                ak[up] = 1
+
+        self.p_grad[rows] = new_pt - pt
+        self.theta[1][rows] = ak
+        self.theta[0][rows] = self._theta(ak)
+        return self._freeze(rows, pt, new_pt)
+
+    def _theta(self, ak):
+        if self.f_theta == 'boyd':
+            ak2 = ak*ak
+            return (np.sqrt(ak2*ak2+4*ak2)-ak2)/2
+        if self.f_theta == 'k2':
+            return np.full(ak.shape, 2/(self.iteration+3))
+        elif type(self.f_theta) == float:
+            return np.full(ak.shape, 1-self.f_theta)
+        return np.full(ak.shape, 0.2)
@@ -0,0 +1,144 @@
+import numpy as np
+
+from . import _GradientDescent
+from toolboxTom.logger import Logger
+
+log = Logger(name='CoordinateDescent')
+
+
+class CoordinateDescent(_GradientDescent):
+    """Coordinate descent for the Lasso, 1/2*|Ax-b|^2 + lmbd*|x|_1
+
+    An iteration is an epoch of n_dims exact minimisations along one
+    coordinate j, x_j = ST(x_j - a_j^T(Ax-b)/|a_j|^2, lmbd/|a_j|^2).
+    The residual Ax-b is updated after each step, in O(n_features). With
+    the Gram matrix A^TA, the gradient A^T(Ax-b) is updated instead, in
+    O(n_dims), which is cheaper when n_features > n_dims.
+
+    Parameters
+    ----------
+    problem: Lasso, or a problem with the attributes A, b and lmbd
+    selection: {'cyclic', 'random', 'greedy'} order of the coordinates.
+        greedy selects the coordinate with the largest step
+        (Gauss-Southwell rule) and always uses the Gram matrix.
+    gram: use the Gram matrix, 'auto' if n_features > n_dims
+    random_state: seed of the random selection
+    """
+    def __init__(self, problem, decreasing_rate='', selection='cyclic',
+                 gram='auto', random_state=None, debug=0, **kwargs):
+        if debug > 0:
+            debug -= 1
+            log.set_level(10)
+        for attr in ['A', 'b', 'lmbd']:
+            if not hasattr(problem, attr):
+                raise ValueError('{} is not a Lasso problem, it has no {}'
+                                 ''.format(problem.__class__.__name__, attr))
+        assert selection in ['cyclic', 'random', 'greedy'], (
+            '{} is not a coordinate selection'.format(selection))
+        self.selection = selection
+        if gram == 'auto':
+            gram = problem.A.shape[0] > problem.A.shape[1]
+        self.gram = gram or selection == 'greedy'
+        self.random_state = random_state
+        super(CoordinateDescent, self).__init__(
+            problem, decreasing_rate=decreasing_rate, debug=debug,
+            **kwargs)
+
+    def __repr__(self):
+        return 'CoordinateDescent - {}'.format(self.selection)
+
+    def _init_algo(self):
+        A = self.pb.A
+        # Rows of At are the columns of A, contiguous in memory
+        self.At = np.ascontiguousarray(A.T)
+        if self.gram:
+            self.G = self.At.dot(A)
+            self.norms = np.diag(self.G).copy()
+        else:
+            self.norms = np.sum(self.At*self.At, axis=1)
+        self.rng = np.random.RandomState(self.random_state)
+        self._version = None
+
+    def _sync(self):
+        '''Compute the residual, or the gradient, of the current point
+
+        Needed when the point of the problem was changed by someone else
+        than p_update.
+        '''
+        if self._version == self.pb.version:
+            return
+        res = self.pb.A.dot(self.pb.pt) - self.pb.b
+        if self.gram:
+            self.corr = self.At.dot(res)
+        else:
+            self.res = res
+
+    def p_update(self):
+        '''Update the coordinates for one epoch
+
+        Return the squared norm of the move of the point.
+        '''
+        self._sync()
+        pt = self.pb.pt
+        n_dims = pt.shape[0]
+        if self.selection == 'greedy':
+            dz = self._greedy_epoch(pt, n_dims)
+        else:
+            if self.selection == 'cyclic':
+                order = range(n_dims)
+            else:
+                order = self.rng.randint(n_dims, size=n_dims)
+            dz = self._epoch(pt, order)
+        # The point was changed in place
+        self.pb._update(pt)
+        self._version = self.pb.version
+        return dz
+
+    def _epoch(self, pt, order):
+        lmbd, norms, At = self.pb.lmbd, self.norms, self.At
+        if self.gram:
+            vec, rows = self.corr, self.G
+        else:
+            vec, rows = self.res, At
+        tmp = np.empty_like(vec)
+        dz = 0
+        for j in order:
+            if norms[j] == 0:
+                continue
+            xj = pt[j]
+            gj = vec[j] if self.gram else At[j].dot(vec)
+            z = xj - gj/norms[j]
+            thr = lmbd/norms[j]
+            new = z - thr if z > thr else (z + thr if z < -thr else 0.)
+            if new != xj:
+                d = new - xj
+                pt[j] = new
+                vec += np.multiply(rows[j], d, out=tmp)
+                dz += d*d
+        return dz
+
+    def _greedy_epoch(self, pt, n_dims):
+        lmbd, norms, G, corr = self.pb.lmbd, self.norms, self.G, self.corr
+        # Steps of the coordinates with a null column are 0
+        inv_norms = np.divide(1, norms, out=np.zeros(n_dims),
+                              where=norms > 0)
+        z, step, tmp = np.empty(n_dims), np.empty(n_dims), np.empty(n_dims)
+        dz = 0
+        for _ in range(n_dims):
+            # step = ST(x - corr/norms, lmbd/norms) - x for all coordinates
+            np.multiply(corr, inv_norms, out=z)
+            np.subtract(pt, z, out=z)
+            np.multiply(inv_norms, lmbd, out=tmp)
+            np.minimum(z, tmp, out=step)
+            np.negative(tmp, out=tmp)
+            np.maximum(step, tmp, out=step)
+            np.subtract(z, step, out=step)
+            step -= pt
+            j = np.argmax(np.abs(step, out=z))
+            d = step[j]
+            if d == 0:
+                break
+            pt[j] += d
+            corr += np.multiply(G[j], d, out=tmp)
+            dz += d*d
+        return dz
@@ -0,0 +1,172 @@
+import numpy as np
+
+from .problem import _Problem
+
+
+def soft_thresholding(pt, lmbd, out=None):
+    '''Proximal operator of lmbd*|.|_1
+
+    With out, the result is written in out, which should not be pt.
+    '''
+    if out is None:
+        return np.sign(pt)*np.maximum(abs(pt)-lmbd, 0)
+    # pt - clip(pt, -lmbd, lmbd), without temporary array
+    np.minimum(pt, lmbd, out=out)
+    np.maximum(out, -lmbd, out=out)
+    return np.subtract(pt, out, out=out)
+
+
+class Lasso(_Problem):
+    """Lasso problem, 1/2*|Ax-b|^2 + lmbd*|x|_1
+
+    Parameters
+    ----------
+    A: (n_features, n_dims) operator
+    b: (n_features,) signal
+    lmbd: regularisation parameter
+
+    With screen, the coordinates which are 0 in the solution are removed
+    from the problem. They are kept to 0 and the columns of A in active
+    are the only ones used by grad and the costs.
+    """
+    inplace = True
+    _data = ('A', 'b', 'lmbd')
+
+    def __init__(self, A, b, lmbd=.1, x0=None):
+        self.A = A
+        self.operator = A
+        self.b = b
+        self.lmbd = lmbd
+        self.active = None
+        self._col_norms = None
+        super(Lasso, self).__init__(x0=x0, size=A.shape[1])
+        self.L = 'auto'
+
+    def reset(self):
+        super(Lasso, self).reset()
+        self.set_active(None)
+
+    def set_active(self, mask):
+        '''Restrict the problem to the coordinates where mask is True
+
+        The other coordinates of pt are set to 0. None restores the full
+        problem.
+        '''
+        # The values cached for the current point, like grad, depend on
+        # the active coordinates
+        self.version += 1
+        if mask is None or mask.all():
+            self.active, self._A_active = None, None
+            return
+        self.active = np.flatnonzero(mask)
+        self._A_active = np.ascontiguousarray(self.A[:, self.active])
+        self[~mask] = 0
+
+    def screen(self):
+        '''Remove the coordinates which are 0 in the solution
+
+        Gap safe rule: the optimal dual point is in the ball of radius
+        sqrt(2*gap) centered on the dual point theta of duality_gap, so
+        the coordinates j with |a_j^T theta| + |a_j|sqrt(2*gap) < lmbd
+        are 0 in the solution. Return the mask of the active coordinates.
+        '''
+        if self._col_norms is None:
+            self._col_norms = np.sqrt(np.sum(self.A*self.A, axis=0))
+        corr, scale, gap = self._dual(self.pt)
+        mask = (scale*abs(corr) + np.sqrt(2*max(gap, 0))*self._col_norms
+                >= self.lmbd)
+        if self.active is not None:
+            mask &= np.isin(np.arange(self.sizes[0]), self.active)
+        self.set_active(mask)
+        return mask
+
+    def _residual(self, pt, out=None):
+        if self.active is None:
+            out = np.dot(self.A, pt, out=out)
+        else:
+            pt = np.take(pt, self.active, out=self._work(
+                'pt_active', self.active.shape, pt.dtype))
+            out = np.dot(self._A_active, pt, out=out)
+        out -= self.b
+        return out
+
+    def _correlation(self, res, out=None):
+        '''Return A^T res, 0 for the coordinates out of active'''
+        if self.active is None:
+            return np.dot(self.A.T, res, out=out)
+        corr = np.dot(self._A_active.T, res, out=self._work(
+            'corr_active', self.active.shape, res.dtype))
+        if out is None:
+            out = np.zeros(self.sizes, dtype=res.dtype)
+        else:
+            out.fill(0)
+        np.put(out, self.active, corr)
+        return out
+
+    def residual(self, pt=None, out=None):
+        '''Return Ax-b, shared by the cost and the gradient
+
+        The residual of the current point is cached in a work array of
+        the problem, overwritten when the point changes. The residual of
+        the other points is written in out if given.
+        '''
+        if pt is not None and pt is not self.pt:
+            return self._residual(pt, out)
+        return self._cached('residual', None, lambda pt: self._residual(
+            pt, self._work('residual', self.b.shape, self._dtype(pt))))
+
+    def _dtype(self, pt):
+        return np.result_type(self.A, pt)
+
+    def _res(self, pt):
+        '''Residual of pt, in a work array if pt is not the current point
+        '''
+        if pt is None or pt is self.pt:
+            return self.residual()
+        return self.residual(pt, self._work('residual_pt', self.b.shape,
+                                            self._dtype(pt)))
+
+    def cost(self, pt=None):
+        def compute(pt):
+            abs_pt = np.abs(pt, out=self._work('abs', pt.shape, pt.dtype))
+            return self.smooth_cost(pt) + self.lmbd*abs_pt.sum()
+        return self._cached('cost', pt, compute)
+
+    def smooth_cost(self, pt=None):
+        def compute(pt):
+            res = self._res(pt)
+            return 0.5*np.vdot(res, res)
+        return self._cached('smooth_cost', pt, compute)
+
+    def grad(self, pt=None, out=None):
+        if out is not None:
+            return self._correlation(self._res(pt), out)
+        return self._cached('grad', pt,
+                            lambda pt: self._correlation(self._res(pt)))
+
+    def prox(self, pt=None, lmbd=None, out=None):
+        if pt is None:
+            pt = self.pt
+        if lmbd is None:
+            lmbd = self.lmbd
+        return soft_thresholding(pt, lmbd, out)
+
+    def _dual(self, pt):
+        '''Return A^T res, the scale of the dual point and the gap
+
+        The dual point theta = -scale*res is the residual b - Ax, rescaled
+        to be feasible, |A^T theta|_inf <= lmbd.
+        '''
+        res = self._res(pt)
+        corr = self.A.T.dot(res)
+        corr_inf = np.max(abs(corr))
+        scale = min(1, self.lmbd / corr_inf) if corr_inf > 0 else 1
+        # D(theta) = 1/2|b|^2 - 1/2|b - theta|^2
+        dual = self.b + scale*res
+        dual = 0.5*(np.vdot(self.b, self.b) - np.vdot(dual, dual))
+        return corr, scale, self.cost(pt) - dual
+
+    def duality_gap(self, pt=None):
+        '''Return the duality gap in pt, an upper bound of cost(pt) - min
+        '''
+        return self._cached('duality_gap', pt, lambda pt: self._dual(pt)[2])
@@ -8,6 +8,8 @@ from . import _GradientDescent
 
 class MomentGradientDescent(_GradientDescent):
     """Gradient Descent with moment update"""
+    _state = _GradientDescent._state + ('p_grad',)
+
     def __init__(self, problem, decreasing_rate='', alpha_moment=0.9,
                  restart=True, debug=0, **kwargs):
         if debug:
@@ -30,20 +32,31 @@ class MomentGradientDescent(_GradientDescent):
         grad: list, optional (default: None)
             list of the gradient for each parameters
         '''
-        self.ppt = np.copy(self.pb.pt)
-        grad = self.pb.grad(self.pb.pt)
-        self.p_grad = grad + self.alpha_moment*self.p_grad
+        pt = self.pb.pt
+        self.ppt = ppt = self._buffer('ppt')
+        np.copyto(ppt, pt)
+        # The cost of the current point was computed by the last restart
+        # test, and is cached by the problem
+        p_cost = self.pb.cost() if self.restart else None
+        grad = self._grad()
+        self.p_grad *= self.alpha_moment
+        self.p_grad += grad
         lr = self._get_lr()
-        self.pt -= lr*self.p_grad
-        if self.restart and self.pb.cost(self.pb.pt) > self.cost[-1]:
-            self.pb._update(self.ppt)
-            grad = self.pb.grad()
-            self.p_grad = grad
-            self.pt -= lr*grad
+        step = self._buffer('step')
+        self.pb -= np.multiply(self.p_grad, lr, out=step)
+        if self.restart and self.pb.cost() > p_cost:
+            np.multiply(grad, lr, out=step)
+            np.subtract(ppt, step, out=self.pb.pt)
+            self.pb._update(self.pb.pt)
+            np.copyto(self.p_grad, grad)
+        dz = np.subtract(self.pb.pt, ppt, out=step)
+        return np.vdot(dz, dz)
 
 
 class NesterovMomentGradientDescent(_GradientDescent):
     """Gradient Descent with the nesterov momentum"""
+    _state = _GradientDescent._state + ('p_grad',)
+
     def __init__(self, problem, decreasing_rate='', alpha_moment=0.9,
                  restart=False, debug=0, **kwargs):
         if debug:
@@ -52,7 +65,7 @@ class NesterovMomentGradientDescent(_GradientDescent):
         super(NesterovMomentGradientDescent, self).__init__(
             problem, decreasing_rate, debug=debug, **kwargs)
         self.alpha_moment = alpha_moment
-        self.p_grad = np.zeros(self.pt.shape)
+        self.p_grad = np.zeros(self.pb.pt.shape)
         self.restart = restart
 
     def __repr__(self):
@@ -63,6 +76,7 @@ class NesterovMomentGradientDescent(_GradientDescent):
         '''Update the parameters with the nesterov momentum
         '''
         self.ppt = self.pb.pt
+        p_cost = self.pb.cost() if self.restart else None
         lr = self._get_lr()
 
         # Compute the intermediate step
@@ -73,10 +87,9 @@ class NesterovMomentGradientDescent(_GradientDescent):
         self.pb._update(self.yn-lr*grad)
 
         # Restart criterion
-        if self.restart and self.pb.cost() > self.cost[-1]:
-            self.pb._update(self.ppt)
-            grad = self.pb.grad()
-            self.pt -= lr*grad
+        if self.restart and self.pb.cost() > p_cost:
+            self.pb._update(self.ppt - lr*self.pb.grad(self.ppt))
 
         # Save movement direction
         self.p_grad = self.alpha_moment*(self.pb.pt-self.ppt)
+        return np.sum((self.pb.pt - self.ppt)**2)
@@ -1,3 +1,5 @@
+import os
+import numpy as np
 from numpy import ndarray
 from multiprocessing import Queue
 from .worker_solver import WorkerSolver
@@ -8,32 +10,72 @@ log = Logger('//Solver', 20)
 
 
 class ParalelSolver(object):
-    """Paralell sparse coding"""
-    def __init__(self, n_jobs=4, debug=0, **kwargs):
+    """Paralell sparse coding
+
+    Parameters
+    ----------
+    n_jobs: # of worker processes
+    checkpoint_dir: directory where the state of the solver of each
+        problem is saved, see the checkpoint argument of _GradientDescent.
+        An interrupted solve restarts from these checkpoints.
+    """
+    def __init__(self, n_jobs=4, debug=0, checkpoint_dir=None, **kwargs):
         super(ParalelSolver, self).__init__()
         self.n_jobs = n_jobs
+        self.checkpoint_dir = checkpoint_dir
+        if checkpoint_dir is not None and not os.path.isdir(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
         self.param = kwargs
         if debug:
             log.set_level(10)
             debug -= 1
         self.debug = debug
 
-    def solve(self, problems, **kwargs):
+    def solve(self, problems, x0=None, **kwargs):
+        '''Solve the problems with the worker processes
+
+        Parameters
+        ----------
+        problems: _Problem or list of _Problem
+        x0: list of the starting points of the problems, to warm start
+            them from the solutions of close problems. None for the
+            current points of the problems. The problems with a starting
+            point do not restart from their checkpoints.
+        '''
         if type(problems) not in [list, ndarray]:
             problems = [problems]
+            if x0 is not None:
+                x0 = [x0]
         assert issubclass(type(problems[0]), _Problem), (
             'ParalelSolver argument is not a _Problem subclass')
+        if x0 is None:
+            x0 = [None]*len(problems)
+        assert len(x0) == len(problems), (
+            'x0 should contain one point per problem')
+        for pb, x in zip(problems, x0):
+            if x is not None:
+                pb._update(np.array(x, dtype=float))
+        # Compute the 'auto' Lipschitz constants before sending the problems,
+        # so it is done once for the problems sharing the same operator
+        for pb in problems:
+            pb.L = pb.L
         qin = Queue()
         qout = Queue()
-        for i, pb in enumerate(problems):
-            qin.put((i, pb))
+        for i, (pb, x) in enumerate(zip(problems, x0)):
+            # The point of a warm started problem is already x
+            qin.put((i, pb, x is not None))
 
+        # The workers report to our log handler, only if they log
+        collector = None
+        if self.debug or self.param.get('logging', False):
+            collector = Logger.collector()
         slaves = []
         for i in range(self.n_jobs):
             slaves += [WorkerSolver(qin, qout, id_w=i,
-                                    debug=self.debug,
+                                    debug=self.debug, collector=collector,
+                                    checkpoint_dir=self.checkpoint_dir,
                                     **self.param)]
-            qin.put((None, None))
+            qin.put((None, None, None))
             slaves[-1].start()
 
         # Join loop
@@ -1,5 +1,9 @@
+import hashlib
 import numpy as np
 
+# Largest eigenvalues of A^TA computed by operator_norm2, by operator
+_L_cache = {}
+
 
 class ImplementationError(Exception):
     """Implementation Error"""
@@ -12,8 +16,72 @@ class ImplementationError(Exception):
         return self.cls+'-'+self.msg
 
 
+def power_iteration(matvec, shape, n_iter=100, tol=1e-6, random_state=0):
+    '''Return the largest eigenvalue of a symmetric positive operator
+
+    Parameters
+    ----------
+    matvec: function computing the product of the operator with a point
+    shape: shape of the points
+    n_iter: max # of iterations
+    tol: stop when the relative change of the estimate is below tol
+    random_state: seed of the random starting point
+    '''
+    v = np.random.RandomState(random_state).randn(*shape)
+    v /= np.linalg.norm(v)
+    L = 0
+    for _ in range(int(n_iter)):
+        w = matvec(v)
+        L_new = np.linalg.norm(w)
+        if L_new == 0:
+            return 0
+        v = w / L_new
+        if abs(L_new - L) <= tol*L_new:
+            return L_new
+        L = L_new
+    return L
+
+
+def operator_norm2(A, n_iter=100, tol=1e-6):
+    '''Return |A|_2^2, the largest eigenvalue of A^TA, with a cache
+
+    The result is cached with a hash of A, so it is computed once for
+    the problems sharing the same operator in this process. The cache is
+    not shared with other processes: ParalelSolver computes L before
+    sending the problems to its workers.
+    '''
+    A = np.ascontiguousarray(A)
+    key = (A.shape, A.dtype.str, hashlib.sha1(A.data).hexdigest())
+    L = _L_cache.get(key)
+    if L is None:
+        L = power_iteration(lambda v: A.T.dot(A.dot(v)), A.shape[1:],
+                            n_iter, tol)
+        _L_cache[key] = L
+    return L
+
+
 class _Problem(object):
-    """Meta class to handle optimisation problem"""
+    """Meta class to handle optimisation problem
+
+    L is the Lipschitz constant of grad. Set it to 'auto' to estimate it
+    with estimate_L the first time it is used.
+
+    pt should only be changed with _update, +=, -= or [], which increase
+    version. The values computed with _cached for the current point are
+    kept until the next change.
+
+    The problems with inplace True accept an out array in grad and prox,
+    where the result is written instead of a new array, so the solvers
+    can run their iterations without allocation.
+    """
+    # Linear operator A of problems whose smooth part is f(Ax), used to
+    # compute L
+    operator = None
+    # grad and prox accept the out argument
+    inplace = False
+    # Attributes defining the problem, hashed by fingerprint
+    _data = ()
+
     def __init__(self, x0=None, size=None):
         super(_Problem, self).__init__()
         self.x0 = x0
@@ -22,31 +90,115 @@ class _Problem(object):
             self.x0 = np.zeros(size)
         self.sizes = self.x0.shape
         self.L = 10
+        self.version = 0
+        self._cache = {}
+        self._buffers = {}
         self.reset()
 
     def cost(self):
         raise ImplementationError('cost not implemented', self.__class__)
 
-    def grad(self, pt=None):
+    def smooth_cost(self, pt=None):
+        '''Cost of the smooth part of the problem, the one of grad'''
+        raise ImplementationError('smooth_cost not implemented',
+                                  self.__class__)
+
+    def grad(self, pt=None, out=None):
         raise ImplementationError('grad not implemented', self.__class__)
 
-    def prox(self, pt=None):
+    def prox(self, pt=None, lmbd=None, out=None):
         raise ImplementationError('prox not implemented', self.__class__)
 
+    @property
+    def L(self):
+        if isinstance(self._L, str) and self._L == 'auto':
+            self._L = self.estimate_L()
+        return self._L
+
+    @L.setter
+    def L(self, L):
+        self._L = L
+
+    def estimate_L(self, n_iter=100, tol=1e-6, safety=1.01):
+        '''Estimate the Lipschitz constant of grad with a power iteration
+
+        With a declared operator A, return |A|_2^2, cached for each
+        operator. Else the power iteration uses differences of grad,
+        exact for quadratic smooth parts. The estimate is increased by
+        safety as the power iteration converges from below.
+
+        Parameters
+        ----------
+        n_iter: max # of iterations of the power iteration
+        tol: relative tolerance on the estimate
+        safety: factor applied to the estimate
+        '''
+        if self.operator is not None:
+            return safety*operator_norm2(self.operator, n_iter, tol)
+        x0 = np.zeros(self.sizes)
+        g0 = self.grad(x0)
+        return safety*power_iteration(lambda v: self.grad(x0+v)-g0,
+                                      self.sizes, n_iter, tol)
+
+    def fingerprint(self):
+        '''Return a hash of the class, the shape of the points and the
+        attributes in _data, to check that a checkpoint was saved while
+        solving this problem'''
+        h = hashlib.sha1(self.__class__.__name__.encode())
+        h.update(str(self.sizes).encode())
+        for name in self._data:
+            value = np.ascontiguousarray(getattr(self, name))
+            h.update('{}{}{}'.format(name, value.shape,
+                                     value.dtype.str).encode())
+            h.update(value.data)
+        return h.hexdigest()
+
+    def _cached(self, name, pt, compute):
+        '''Return compute(pt), computed once for each version of self.pt
+
+        Only the values for the current point, pt None or self.pt, are
+        cached. The other points are always computed. The cached values
+        are shared, so they should not be modified.
+        '''
+        if pt is not None and pt is not self.pt:
+            return compute(pt)
+        version, value = self._cache.get(name, (None, None))
+        if version != self.version:
+            value = compute(self.pt)
+            self._cache[name] = (self.version, value)
+        return value
+
+    def _work(self, name, shape, dtype=float):
+        '''Return the work array name of the problem, allocated once
+
+        Its content is overwritten by the next computation using it.
+        '''
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
+
     def reset(self):
         self.pt = np.copy(self.x0)
+        self.version += 1
 
     def __iadd__(self, update):
         self.pt += update
+        self.version += 1
+        return self
 
     def __isub__(self, update):
         self.pt -= update
+        self.version += 1
+        return self
 
     def __setitem__(self, k, update):
         self.pt[k] = update
+        self.version += 1
 
     def __getitem__(self, k):
         return self.pt[k]
 
     def _update(self, update):
         self.pt = update
+        self.version += 1
@@ -8,10 +8,22 @@ log = Logger(name='ProximalDescent')
 
 
 class ProximalDescent(_GradientDescent):
-    """Gradient Descent with the nesterov momentum"""
+    """Gradient Descent with the nesterov momentum
+
+    With screening=k, the coordinates which are 0 in the solution are
+    removed from the problem every k iterations, with its screen method
+    (see Lasso.screen). The iterations get cheaper as the solver
+    converges.
+    """
+    _state = _GradientDescent._state + ('p_grad', 'theta')
+
     def __init__(self, problem, decreasing_rate='', f_theta='boyd',
-                 restart=False, debug=0, **kwargs):
+                 restart=False, screening=0, debug=0, **kwargs):
         self.restart = restart
+        if screening and not hasattr(problem, 'screen'):
+            raise ValueError('{} does not support screening'.format(
+                problem.__class__.__name__))
+        self.screening = screening
         if debug > 0:
             debug -= 1
             log.set_level(10)
@@ -31,29 +43,95 @@ class ProximalDescent(_GradientDescent):
 
     def p_update(self):
         '''Update the parameters with the nesterov momentum
+
+        Without line search, the iterates are written alternatively in
+        two work arrays, so the iterations do not allocate memory. The
+        last one is copied in the problem by end.
         '''
-        self.ppt = self.pb.pt
+        if self.screening and self.iteration % self.screening == 0:
+            self._screen()
+        self.ppt = ppt = self.pb.pt
 
         lr = self._get_lr()
         lmbd = self.pb.lmbd
         ak, ak1 = self.theta
-        self.yn = self.pb.pt+ak*(1/ak1-1)*self.p_grad
-        grad = self.pb.grad(self.yn)
+        f_ppt = self.f_pt
+        momentum = ak*(1/ak1-1)
+        self.yn = yn = np.multiply(self.p_grad, momentum,
+                                   out=self._buffer('yn'))
+        yn += ppt
+        grad = self._grad(yn)
 
-        self.pb._update(self.pb.prox(self.yn-lr*grad, lmbd*lr))
+        if self.line_search:
+            # The smooth cost of the last point is known if yn is the same
+            f_yn = f_ppt
+            if f_yn is None or (momentum != 0 and np.any(self.p_grad)):
+                f_yn = self._smooth_cost(yn)
+            self._prox_step(yn, grad, f_yn)
+        else:
+            self.pb._update(self._prox_point(yn, grad, lr, lmbd,
+                                             self._next_point(ppt)))
 
-        # Restart if needed
-        res_cond = (self.yn - self.pb.pt).dot((self.pb.pt - self.ppt).T).sum()
+        # Restart if needed, with res_cond = <yn - pt, pt - ppt>
+        pt = self.pb.pt
+        np.subtract(pt, ppt, out=self.p_grad)
+        res_cond = np.vdot(np.subtract(yn, pt, out=yn), self.p_grad)
         if self.restart and res_cond > 0:
             log.debug('Restart')
-            self.yn = self.ppt
-            grad = self.pb.grad(self.yn)
-            self.pb._update(self.pb.prox(self.yn-lr*grad, lmbd*lr))
+            self.yn = ppt
+            grad = self._grad(ppt)
+            if self.line_search:
+                if f_ppt is None:
+                    f_ppt = self._smooth_cost(ppt)
+                self._prox_step(ppt, grad, f_ppt)
+            else:
+                # The rejected point is overwritten
+                self.pb._update(self._prox_point(ppt, grad, lr, lmbd, pt))
+            np.subtract(self.pb.pt, ppt, out=self.p_grad)
 
         #Update momentum information
-        self.p_grad = self.pb.pt-self.ppt
         self.theta = [self._theta(ak), ak]
-        return np.sum(self.p_grad*self.p_grad)
+        return np.vdot(self.p_grad, self.p_grad)
+
+    def _init_algo(self):
+        if self.screening:
+            self.pb.set_active(None)
+
+    def end(self):
+        super(ProximalDescent, self).end()
+        if self.screening:
+            # The solution is 0 on the removed coordinates
+            self.pb.set_active(None)
+
+    def _screen(self):
+        mask = self.pb.screen()
+        # The removed coordinates stay at 0
+        self.p_grad[~mask] = 0
+        self.f_pt = None
+        log.debug('{} - Screening - {} active coordinates'.format(
+            self.__repr__(), mask.sum()))
+
+    def _next_point(self, ppt):
+        '''Return the work array for the next iterate, which is not ppt'''
+        pt0 = self._buffer('pt0')
+        return pt0 if ppt is not pt0 else self._buffer('pt1')
+
+    def _prox_point(self, yn, grad, lr, lmbd, out):
+        '''Return prox(yn - lr*grad), written in out if possible'''
+        z = np.multiply(grad, -lr, out=self._buffer('z'))
+        z += yn
+        if getattr(self.pb, 'inplace', False):
+            return self.pb.prox(z, lmbd*lr, out=out)
+        return self.pb.prox(z, lmbd*lr)
+
+    def _smooth_cost(self, pt):
+        return self.pb.smooth_cost(pt)
+
+    def _prox_step(self, yn, grad, f_yn):
+        '''Proximal step from yn with the backtracking line search'''
+        lmbd = self.pb.lmbd
+        self.pb._update(self._backtrack(
+            yn, grad, f_yn, lambda lr: self.pb.prox(yn-lr*grad, lmbd*lr)))
 
     def _theta(self, ak):
         if self.f_theta == 'boyd':
@@ -1,3 +1,4 @@
+import numpy as np
 from time import time
 
 
@@ -17,19 +18,36 @@ class Solver(object):
         if debug:
             log.set_level(10)
 
-    def solve(self, pb, **kwargs):
+    def solve(self, pb, x0=None, **kwargs):
+        '''Solve pb, starting from its current point or from x0
+
+        With x0, the solver does not restart from its checkpoint, which
+        is overwritten.
+        The keyword arguments update the parameters of the optimizer.
+        '''
         self.pb = pb
+        if x0 is not None:
+            pb._update(np.array(x0, dtype=float))
         self.param.update(**kwargs)
-        solver = self.optim(self.pb, **self.param)
+        param = self.param
+        if x0 is not None and param.get('checkpoint') is not None:
+            # Start from x0, not from the checkpoint of a previous solve
+            param = dict(param, resume=False)
+        solver = self.optim(self.pb, **param)
         finished = False
         self.start_time = time()
         self.iter = 0
-        while not finished and not self._stop():
-            finished = solver.update()
-            self.iter += 1
+        with log.span('solve', problem=self.param.get('name')):
+            while not finished and not self._stop():
+                finished = solver.update()
+                self.iter += 1
+        if not finished and self.iter > 0:
+            # Stopped by max_time or i_max, save the checkpoint
+            solver.end()
         self._end()
-        self.pt = solver.pt
-        self.cost = solver.cost
+        self.pt = pb.pt
+        self.cost = pb.cost()
+        self.stop_reason = getattr(solver, 'stop_reason', None)
         return self.pt
 
     def _stop(self):
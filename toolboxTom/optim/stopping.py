@@ -0,0 +1,200 @@
+import numpy as np
+from math import ceil
+
+from . import ImplementationError
+
+
+class StoppingRule(object):
+    """Convergence test of a solver
+
+    With every='auto', the rule is checked every period iterations, with
+    period chosen so that the checks cost about budget of the iterations.
+    Both costs are counted in applications of the operator of the
+    problem: n_ops for a check and solver.n_ops for an iteration. So the
+    rules needing extra computations, like a cost or a gradient, are
+    checked less often, and the stop iterate does not depend on the load
+    of the machine.
+
+    Parameters
+    ----------
+    tol: tolerance of the rule
+    every: # of iterations between two checks, or 'auto'
+    """
+    name = 'rule'
+    # Applications of the operator for a check, on top of the iteration
+    n_ops = 0
+    budget = .05
+    max_every = 100
+
+    def __init__(self, tol, every='auto'):
+        self.tol = tol
+        self.every = every
+        self.value = None
+        self.period = 1
+
+    def __repr__(self):
+        return '{}(tol={:g})'.format(self.name, self.tol)
+
+    def reset(self, solver):
+        '''Called when the solver (re)starts'''
+        self.value = None
+        self.period = self.every
+        if self.every == 'auto':
+            n_ops = self.budget*getattr(solver, 'n_ops', 1)
+            self.period = min(max(1, int(ceil(self.n_ops / n_ops))),
+                              self.max_every)
+
+    def __call__(self, solver, dz):
+        '''Return True if the solver has converged
+
+        Parameters
+        ----------
+        solver: the _GradientDescent
+        dz: squared norm of the last step, returned by p_update
+        '''
+        if solver.iteration % self.period != 0:
+            return False
+        return self.check(solver, dz)
+
+    def check(self, solver, dz):
+        raise ImplementationError('check not implemented', self.__class__)
+
+
+class StepNorm(StoppingRule):
+    """Stop when |x_k - x_k-1| <= tol*|x_k|
+
+    With relative False, stop when |x_k - x_k-1|^2 < tol, the historical
+    criterion of the solvers.
+    """
+    name = 'step'
+
+    def __init__(self, tol=1e-10, every='auto', relative=True):
+        super(StepNorm, self).__init__(tol, every)
+        self.relative = relative
+
+    def check(self, solver, dz):
+        if not self.relative:
+            self.value = dz
+            return dz < self.tol
+        pt = solver.pb.pt
+        self.value = np.sqrt(dz / max(np.vdot(pt, pt), 1e-300))
+        return self.value <= self.tol
+
+
+class GradientMapping(StoppingRule):
+    """Stop when the gradient mapping is tol times smaller than at the
+    first check
+
+    The gradient mapping G(x) = (x - prox(x - lr*grad(x), lr*lmbd))/lr
+    is 0 only at the minimum of the problem. It is the gradient for the
+    problems without lmbd. The step lr is 1/L.
+    """
+    name = 'grad'
+    # grad of the current point, A then A^T
+    n_ops = 2
+
+    def __init__(self, tol=1e-6, every='auto'):
+        super(GradientMapping, self).__init__(tol, every)
+        self.norm0 = None
+
+    def reset(self, solver):
+        super(GradientMapping, self).reset(solver)
+        self.norm0 = None
+
+    def check(self, solver, dz):
+        pb = solver.pb
+        grad = pb.grad()
+        lmbd = getattr(pb, 'lmbd', None)
+        if lmbd is not None:
+            lr = 1 / pb.L
+            grad = (pb.pt - pb.prox(pb.pt - lr*grad, lr*lmbd)) / lr
+        self.value = np.sqrt(np.vdot(grad, grad))
+        if self.norm0 is None:
+            self.norm0 = max(self.value, 1e-300)
+            return self.value == 0
+        return self.value <= self.tol*self.norm0
+
+
+class CostDecrease(StoppingRule):
+    """Stop when the cost decreased less than tol*|cost| per iteration
+    since the last check
+
+    The decrease is divided by the # of iterations since the last check,
+    so tol does not depend on the period of the checks.
+    """
+    name = 'cost'
+    # Residual of the current point
+    n_ops = 1
+
+    def __init__(self, tol=1e-8, every='auto'):
+        super(CostDecrease, self).__init__(tol, every)
+        self.p_cost = None
+        self.p_iteration = 0
+
+    def reset(self, solver):
+        super(CostDecrease, self).reset(solver)
+        self.p_cost = None
+        self.p_iteration = 0
+
+    def check(self, solver, dz):
+        cost = solver.pb.cost()
+        p_cost, self.p_cost = self.p_cost, cost
+        n_iter = solver.iteration - self.p_iteration
+        self.p_iteration = solver.iteration
+        if p_cost is None or n_iter <= 0:
+            return False
+        self.value = (p_cost - cost) / max(abs(cost), 1e-300) / n_iter
+        # A cost increase is not a convergence
+        return 0 <= self.value <= self.tol
+
+
+class DualityGap(StoppingRule):
+    """Stop when the duality gap is below tol*cost
+
+    The problem should implement duality_gap, like Lasso.
+    """
+    name = 'gap'
+    # Residual and correlation of the current point
+    n_ops = 2
+
+    def __init__(self, tol=1e-6, every='auto'):
+        super(DualityGap, self).__init__(tol, every)
+
+    def reset(self, solver):
+        super(DualityGap, self).reset(solver)
+        if not hasattr(solver.pb, 'duality_gap'):
+            raise ValueError('{} has no duality gap'.format(
+                solver.pb.__class__.__name__))
+
+    def check(self, solver, dz):
+        self.value = solver.pb.duality_gap()
+        return self.value <= self.tol*max(abs(solver.pb.cost()), 1e-300)
+
+
+RULES = {'step': StepNorm, 'grad': GradientMapping, 'cost': CostDecrease,
+         'gap': DualityGap}
+
+
+def get_stopping(stop, tol):
+    '''Return the list of StoppingRule described by stop
+
+    Parameters
+    ----------
+    stop: 'none' for no rule, '' or 'up5' for |x_k - x_k-1|^2 < tol, a
+        name of RULES, built with tol, a StoppingRule or a list of them.
+        The solver stops when one of the rules is verified.
+    tol: tolerance of the rules given by name
+    '''
+    if stop is None or isinstance(stop, (str, StoppingRule)):
+        stop = [stop]
+    rules = []
+    for rule in stop:
+        if rule == 'none':
+            continue
+        if rule is None or rule in ('', 'up5'):
+            rule = StepNorm(tol, every=1, relative=False)
+        elif isinstance(rule, str):
+            assert rule in RULES, '{} is not a stopping rule'.format(rule)
+            rule = RULES[rule](tol)
+        rules.append(rule)
+    return rules
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim.lasso import Lasso
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'lasso(**kwargs): default arguments of make_lasso')
+
+
+@pytest.fixture
+def make_lasso(request):
+    '''Return a function building a random Lasso problem
+
+    A and b are drawn with RandomState(seed), so the problems built with
+    the same arguments are equal. The default arguments are set for a
+    module or a test with the lasso marker, e.g.
+        pytestmark = pytest.mark.lasso(n_features=50, n_dims=100)
+
+    Parameters of the function
+    --------------------------
+    n_features, n_dims: shape of A
+    lmbd: regularisation parameter
+    lmbd_ratio: if not None, lmbd is lmbd_ratio*|A^Tb|_inf, the fraction
+        of the smallest lmbd with a null solution
+    seed: seed of A and b
+    cls: class of the problem, Lasso or a subclass
+    '''
+    defaults = dict(n_features=30, n_dims=50, lmbd=.1, lmbd_ratio=None,
+                    seed=0, cls=Lasso)
+    # The markers closest to the test override the others
+    for marker in reversed(list(request.node.iter_markers('lasso'))):
+        defaults.update(marker.kwargs)
+
+    def make_lasso(**kwargs):
+        param = dict(defaults, **kwargs)
+        rng = np.random.RandomState(param['seed'])
+        A = rng.randn(param['n_features'], param['n_dims'])
+        b = rng.randn(param['n_features'])
+        lmbd = param['lmbd']
+        if param['lmbd_ratio'] is not None:
+            lmbd = param['lmbd_ratio']*np.max(abs(A.T.dot(b)))
+        return param['cls'](A, b, lmbd=lmbd)
+    return make_lasso
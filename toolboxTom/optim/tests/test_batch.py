@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim.lasso import Lasso
+from toolboxTom.optim.proximal import ProximalDescent
+from toolboxTom.optim.batch import (BatchLasso, BatchGradientDescent,
+                                    BatchMomentGradientDescent,
+                                    BatchProximalDescent)
+
+
+def _problems(n_problems=8, lmbd=1):
+    rng = np.random.RandomState(0)
+    A = rng.randn(30, 50)
+    return [Lasso(A, b, lmbd=lmbd) for b in rng.randn(n_problems, 30)]
+
+
+def test_batch_proximal():
+    pbs = _problems()
+    for pb in pbs:
+        ProximalDescent(pb, tol=1e-12, i_max=200, t_max=100).fit(pb)
+    batch = BatchLasso.from_problems(_problems())
+    BatchProximalDescent(batch, tol=1e-12, i_max=200, t_max=100).fit(batch)
+    assert np.allclose(batch.pt, [pb.pt for pb in pbs])
+    assert np.allclose(batch.costs(), [pb.cost() for pb in pbs])
+
+
+def test_batch_freeze():
+    pbs = _problems(lmbd=0)
+    batch = BatchLasso.from_problems(pbs)
+    # The first problem is already solved and stays frozen
+    batch.B[0] = 0
+    for solver in [BatchGradientDescent, BatchMomentGradientDescent]:
+        batch.reset()
+        s = solver(batch, tol=1e-16, i_max=5000, t_max=100)
+        s.fit(batch)
+        assert not s.active.any() and s.iteration < 5000
+        assert np.all(batch.pt[0] == 0)
+        assert np.allclose(batch.residual(batch.pt)[1:].dot(batch.A), 0,
+                           atol=1e-6)
+
+
+def test_batch_line_search():
+    batch = BatchLasso.from_problems(_problems())
+    for solver in [BatchGradientDescent, BatchMomentGradientDescent,
+                   BatchProximalDescent]:
+        with pytest.raises(ValueError):
+            solver(batch, line_search=True)
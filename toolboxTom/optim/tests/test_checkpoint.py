@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pytest
+
+from toolboxTom.optim.lasso import Lasso
+from toolboxTom.optim.proximal import ProximalDescent
+from toolboxTom.optim.solver import Solver
+from toolboxTom.optim.paralel_solver import ParalelSolver
+
+
+pytestmark = pytest.mark.lasso(n_dims=60, lmbd=.5)
+
+
+def _solver(pb, **kwargs):
+    return ProximalDescent(pb, stop='none', i_max=200, t_max=100,
+                           restart=True, line_search=True, **kwargs)
+
+
+def test_resume(tmpdir, make_lasso):
+    fname = str(tmpdir.join('ckpt.npz'))
+    pb = make_lasso()
+    s = _solver(pb)
+    s.fit(pb)
+
+    # Interrupted after 50 iterations
+    pb_int = make_lasso()
+    s_int = _solver(pb_int, checkpoint=fname, checkpoint_every=0)
+    for _ in range(50):
+        s_int.update()
+    assert os.path.exists(fname)
+
+    pb_new = make_lasso()
+    s_new = _solver(pb_new, checkpoint=fname)
+    s_new.fit(pb_new)
+    assert s_new.iteration == 200
+    assert np.allclose(pb_new.pt, pb.pt)
+    assert np.isclose(s_new.L, s.L)
+
+    # The checkpoint of a finished solver gives its solution
+    pb_done = make_lasso()
+    s_done = _solver(pb_done, checkpoint=fname)
+    s_done.fit(pb_done)
+    assert s_done.stop_reason == 'max_iter'
+    assert s_done.iteration == 200
+    assert np.array_equal(pb_done.pt, pb_new.pt)
+
+
+def test_changed_problem(tmpdir, make_lasso):
+    fname = str(tmpdir.join('ckpt.npz'))
+    pb = make_lasso()
+    solver = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100,
+                    checkpoint=fname)
+    solver.solve(pb)
+    assert solver.stop_reason == 'gap'
+
+    # The finished checkpoint of another problem is not its solution
+    pb2 = Lasso(pb.A, 10*pb.b, lmbd=pb.lmbd)
+    solver2 = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100,
+                     checkpoint=fname)
+    solver2.solve(pb2)
+    assert solver2.stop_reason == 'gap'
+    assert solver2.iter > 1
+    assert pb2.duality_gap() <= 1e-8*pb2.cost()
+    assert pb.fingerprint() != pb2.fingerprint()
+
+
+def test_warm_start_checkpoint(tmpdir, make_lasso):
+    fname = str(tmpdir.join('ckpt.npz'))
+    pb = make_lasso()
+    solver = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100,
+                    checkpoint=fname)
+    x = solver.solve(pb)
+
+    # An explicit x0 is not replaced by the finished checkpoint
+    pb.reset()
+    x0 = np.ones(60)
+    solver = Solver(ProximalDescent, stop='none', i_max=1, t_max=100,
+                    checkpoint=fname)
+    solver.solve(pb, x0=x0)
+    pt = pb.prox(x0 - pb.grad(x0)/pb.L, pb.lmbd/pb.L)
+    assert np.allclose(solver.pt, pt)
+    assert not np.allclose(solver.pt, x)
+
+
+def test_warm_start(make_lasso):
+    pb = make_lasso()
+    solver = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100)
+    x = solver.solve(pb)
+    assert solver.stop_reason == 'gap'
+    assert np.isclose(solver.cost, pb.cost(x))
+
+    # A slightly different problem starts close to its solution
+    pb2 = make_lasso()
+    pb2.b = pb2.b + 1e-3
+    n_cold = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100)
+    n_cold.solve(pb2)
+    pb2.reset()
+    n_warm = Solver(ProximalDescent, stop='gap', tol=1e-8, t_max=100)
+    n_warm.solve(pb2, x0=x)
+    assert n_warm.iter < n_cold.iter
+
+
+def test_paralel_warm_start(tmpdir, make_lasso):
+    problems = [make_lasso(seed=i) for i in range(3)]
+    x0 = [np.ones(60)*i for i in range(3)]
+    solver = ParalelSolver(n_jobs=2, optim=ProximalDescent, stop='none',
+                           i_max=1, checkpoint_dir=str(tmpdir))
+    solver.solve(problems, x0=x0)
+    assert len(tmpdir.listdir()) == 3
+    for x, pb, sol in zip(x0, problems, solver.solutions):
+        assert np.array_equal(pb.pt, x)
+        pt = pb.prox(x - pb.grad(x)/pb.L, pb.lmbd/pb.L)
+        assert np.allclose(sol, pt)
+
+
+def test_paralel_no_collector(monkeypatch, make_lasso):
+    from toolboxTom.logger import Logger
+    calls = []
+    monkeypatch.setattr(Logger, 'collector',
+                        staticmethod(lambda: calls.append(1)))
+    solver = ParalelSolver(n_jobs=2, optim=ProximalDescent, i_max=5)
+    solver.solve([make_lasso(seed=i) for i in range(2)])
+    # Nothing logs in the workers, no handler is started for them
+    assert calls == []
+    solver = ParalelSolver(n_jobs=2, debug=2, optim=ProximalDescent,
+                           i_max=5)
+    solver.solve([make_lasso(seed=i) for i in range(2)])
+    assert calls == [1]
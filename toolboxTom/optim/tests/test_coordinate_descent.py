@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim.proximal import ProximalDescent
+from toolboxTom.optim.coordinate_descent import CoordinateDescent
+from toolboxTom.optim.problem import _Problem
+from toolboxTom.optim.solver import Solver
+
+
+pytestmark = pytest.mark.lasso(n_features=40, n_dims=60, lmbd_ratio=.1)
+
+
+def _solution(pb):
+    s = ProximalDescent(pb, stop='gap', tol=1e-12, i_max=1e5, t_max=100)
+    s.fit(pb)
+    pt = np.copy(pb.pt)
+    pb.reset()
+    return pt
+
+
+@pytest.mark.parametrize('selection', ['cyclic', 'random', 'greedy'])
+@pytest.mark.parametrize('shape', [(40, 60), (100, 20)])
+def test_selection(selection, shape, make_lasso):
+    n_features, n_dims = shape
+    pb = make_lasso(n_features=n_features, n_dims=n_dims)
+    x_star = _solution(pb)
+    s = CoordinateDescent(pb, selection=selection, random_state=0,
+                          stop='gap', tol=1e-10, i_max=1e4, t_max=100)
+    s.fit(pb)
+    assert s.stop_reason == 'gap'
+    assert np.allclose(pb.pt, x_star, atol=1e-6)
+
+
+def test_gram_same_iterates(make_lasso):
+    pts = []
+    for gram in [False, True]:
+        pb = make_lasso()
+        s = CoordinateDescent(pb, gram=gram, stop='none', i_max=10,
+                              t_max=100)
+        s.fit(pb)
+        pts.append(pb.pt)
+    assert np.allclose(*pts)
+
+
+def test_solver_warm_start(make_lasso):
+    pb = make_lasso()
+    x_star = _solution(pb)
+    solver = Solver(CoordinateDescent, stop='gap', tol=1e-10, t_max=100)
+    x = solver.solve(pb, x0=x_star)
+    assert solver.iter <= 20
+    assert np.allclose(x, x_star, atol=1e-6)
+
+
+def test_not_lasso():
+    with pytest.raises(ValueError):
+        CoordinateDescent(_Problem(size=3))
@@ -0,0 +1,66 @@
+import tracemalloc
+import numpy as np
+import pytest
+
+from toolboxTom.optim import _GradientDescent
+from toolboxTom.optim.lasso import soft_thresholding
+from toolboxTom.optim.momentGD import MomentGradientDescent
+from toolboxTom.optim.proximal import ProximalDescent
+
+
+pytestmark = pytest.mark.lasso(n_features=100, n_dims=200, lmbd=.5)
+
+
+def test_out(make_lasso):
+    pb = make_lasso()
+    pt = np.random.RandomState(1).randn(200)
+    out = np.empty(200)
+    assert pb.grad(pt, out=out) is out
+    assert np.allclose(out, pb.A.T.dot(pb.A.dot(pt) - pb.b))
+    assert pb.prox(pt, .3, out=out) is out
+    assert np.allclose(out, soft_thresholding(pt, .3))
+    pb._update(pt)
+    assert np.allclose(pb.grad(out=out), pb.grad())
+
+
+def _allocated(solver, n_iter=20):
+    '''Peak of the memory allocated by n_iter steady-state iterations'''
+    for _ in range(5):
+        solver.update()
+    tracemalloc.start()
+    try:
+        for _ in range(n_iter):
+            solver.p_update()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_no_allocation(make_lasso):
+    for cls in [_GradientDescent, MomentGradientDescent, ProximalDescent]:
+        pb = make_lasso()
+        s = cls(pb, decreasing_rate='', stop='none', i_max=1e6, t_max=1e6)
+        # Less than a point of 200 floats
+        assert _allocated(s) < 1600, cls
+
+
+def test_inplace_same_iterates(make_lasso):
+    pb, pb_copy = make_lasso(), make_lasso()
+    pb_copy.inplace = False
+    for p in [pb, pb_copy]:
+        s = ProximalDescent(p, i_max=200, t_max=100, restart=True)
+        s.fit(p)
+    assert np.allclose(pb.pt, pb_copy.pt)
+
+
+def test_solution_not_aliased(make_lasso):
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop='none', i_max=50, t_max=100)
+    s.fit(pb)
+    x = pb.pt
+    x_copy = np.copy(x)
+    assert all(x is not buf for buf in s._buffers.values())
+    pb.reset()
+    s.i_max = 10
+    s.fit(pb)
+    assert np.array_equal(x, x_copy)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from toolboxTom.optim import _GradientDescent
+from toolboxTom.optim.proximal import ProximalDescent
+
+
+def _loose(pb):
+    '''Set a loose bound on the Lipschitz constant of pb
+
+    Return the Lipschitz constant.
+    '''
+    L = pb.L
+    pb.L = np.sum(pb.A*pb.A)
+    return L
+
+
+def test_line_search_proximal(make_lasso):
+    costs = []
+    for line_search in [False, True]:
+        pb = make_lasso(lmbd=1)
+        L = _loose(pb)
+        s = ProximalDescent(pb, tol=1e-16, i_max=100, t_max=100,
+                            line_search=line_search)
+        s.fit(pb)
+        costs.append(pb.cost())
+    assert costs[1] < costs[0]
+    assert s.L <= 2*L
+
+
+def test_line_search_gradient(make_lasso):
+    pb = make_lasso(lmbd=0)
+    L = _loose(pb)
+    s = _GradientDescent(pb, decreasing_rate='', tol=1e-16, i_max=1000,
+                         t_max=100, line_search=True)
+    s.fit(pb)
+    assert np.allclose(pb.grad(), 0, atol=1e-6)
+    assert s.L <= 2*L
+
+
+def test_line_search_decreasing_rate(make_lasso):
+    # The step of the line search is 1/L, whatever decreasing_rate is
+    results = []
+    for decreasing_rate in ['', 'sqrt']:
+        pb = make_lasso(lmbd=0)
+        L = _loose(pb)
+        s = _GradientDescent(pb, decreasing_rate=decreasing_rate,
+                             tol=1e-16, i_max=200, t_max=100,
+                             line_search=True)
+        s.fit(pb)
+        results.append((s.L, pb.pt))
+    assert results[0][0] == results[1][0]
+    assert np.array_equal(results[0][1], results[1][1])
+    assert L/4 <= s.L <= 2*L
+
+
+def test_estimate_L(make_lasso):
+    from toolboxTom.optim import problem
+
+    # L is 'auto' in the new problem
+    pb = make_lasso(lmbd=1)
+    L_ref = np.linalg.norm(pb.A, ord=2)**2
+    assert L_ref <= pb.L <= 1.02*L_ref
+    assert len(problem._L_cache) > 0
+
+    # Without operator, the estimate uses the differences of grad
+    pb.operator = None
+    assert L_ref <= pb.estimate_L() <= 1.02*L_ref
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim.lasso import Lasso
+from toolboxTom.optim.momentGD import MomentGradientDescent
+
+
+class CountingLasso(Lasso):
+    def __init__(self, *args, **kwargs):
+        self.n_residuals = 0
+        super(CountingLasso, self).__init__(*args, **kwargs)
+
+    def _residual(self, pt, out=None):
+        self.n_residuals += 1
+        return super(CountingLasso, self)._residual(pt, out)
+
+
+pytestmark = pytest.mark.lasso(cls=CountingLasso)
+
+
+def test_cache(make_lasso):
+    pb = make_lasso()
+    pb.grad()
+    pb.cost()
+    pb.cost(pb.pt)
+    assert pb.n_residuals == 1
+    pb -= 1e-3*pb.grad()
+    pb.cost()
+    pb[0] = 1
+    pb.grad()
+    assert pb.n_residuals == 3
+    pb.cost(np.ones(50))
+    assert pb.n_residuals == 4
+    assert np.isclose(pb.cost(), 0.5*np.sum((pb.A.dot(pb.pt)-pb.b)**2) +
+                      .1*np.sum(abs(pb.pt)))
+
+
+def test_moment_restart_cache(make_lasso):
+    pb = make_lasso(lmbd=0)
+    s = MomentGradientDescent(pb, tol=1e-20, i_max=100, t_max=100)
+    s.fit(pb)
+    # One residual for the grad and the cost of each iterate, and one for
+    # each restart
+    assert pb.n_residuals < 1.5*s.iteration
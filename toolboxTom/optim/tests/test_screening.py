@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim.proximal import ProximalDescent
+from toolboxTom.optim.problem import _Problem
+
+
+pytestmark = pytest.mark.lasso(n_features=50, n_dims=200, lmbd_ratio=.5)
+
+
+def test_screen_safe(make_lasso):
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop='gap', tol=1e-12, i_max=1e5, t_max=100)
+    s.fit(pb)
+    support = pb.pt != 0
+
+    pb_scr = make_lasso()
+    s = ProximalDescent(pb_scr, stop='none', i_max=30, t_max=100)
+    s.fit(pb_scr)
+    mask = pb_scr.screen()
+    assert mask.sum() < 200
+    # The screened coordinates are 0 in the solution
+    assert not np.any(support & ~mask)
+    assert np.all(pb_scr.pt[~mask] == 0)
+    assert np.allclose(pb_scr.grad()[mask],
+                       pb_scr.A[:, mask].T.dot(pb_scr.residual()))
+
+
+def test_unscreen_cache(make_lasso):
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop='none', i_max=30, t_max=100)
+    s.fit(pb)
+    pb.screen()
+    pb.grad()
+    # The gradient restricted to the active coordinates is not reused
+    pb.set_active(None)
+    assert np.allclose(pb.grad(), pb.A.T.dot(pb.A.dot(pb.pt) - pb.b))
+
+
+def test_screening_solution(make_lasso):
+    pb, pb_scr = make_lasso(), make_lasso()
+    for p, screening in [(pb, 0), (pb_scr, 10)]:
+        s = ProximalDescent(p, stop='gap', tol=1e-10, i_max=1e5, t_max=100,
+                            screening=screening)
+        s.fit(p)
+    assert p.active is None
+    assert np.allclose(pb.pt, pb_scr.pt)
+    assert np.isclose(pb.cost(), pb_scr.cost())
+
+
+def test_screening_needs_screen():
+    with pytest.raises(ValueError):
+        ProximalDescent(_Problem(size=3), screening=10)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from toolboxTom.optim import _GradientDescent, ImplementationError
+from toolboxTom.optim.problem import _Problem
+from toolboxTom.optim.proximal import ProximalDescent
+from toolboxTom.optim.stopping import (StepNorm, CostDecrease,
+                                      StoppingRule, get_stopping)
+
+
+pytestmark = pytest.mark.lasso(n_features=50, n_dims=100, lmbd=1)
+
+
+def test_duality_gap(make_lasso):
+    pb = make_lasso()
+    assert pb.duality_gap() >= 0
+    s = ProximalDescent(pb, stop='none', i_max=5000, t_max=100)
+    s.fit(pb)
+    assert s.stop_reason == 'max_iter'
+    assert 0 <= pb.duality_gap() < 1e-6
+
+
+@pytest.mark.parametrize('stop', ['step', 'grad', 'cost', 'gap'])
+def test_rules(stop, make_lasso):
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop=stop, tol=1e-8, i_max=1e5, t_max=100)
+    s.fit(pb)
+    assert s.stop_reason == stop
+    rule = s.stopping[0]
+    assert s.iteration % rule.period == 0
+    assert pb.duality_gap() < 1e-2
+
+
+def test_gradient_rule_smooth(make_lasso):
+    pb = make_lasso(lmbd=0)
+    s = _GradientDescent(pb, decreasing_rate='', stop='grad', tol=1e-6,
+                         i_max=1e5, t_max=100)
+    s.fit(pb)
+    assert s.stop_reason == 'grad'
+    assert np.linalg.norm(pb.grad()) < 1e-5*np.linalg.norm(pb.A.T.dot(pb.b))
+
+
+def test_auto_every(make_lasso):
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop=['step', 'cost', 'gap'], tol=1e-8)
+    s.reset()
+    periods = [rule.period for rule in s.stopping]
+    assert periods == [1, 10, 20]
+
+    # The period does not depend on the time, the stop is reproducible
+    iterations = []
+    for _ in range(3):
+        pb = make_lasso()
+        s = ProximalDescent(pb, stop='cost', tol=1e-8, i_max=1e5,
+                            t_max=100)
+        s.fit(pb)
+        iterations.append(s.iteration)
+    assert len(set(iterations)) == 1
+
+
+def test_fixed_every(make_lasso):
+    pb = make_lasso()
+    rule = CostDecrease(tol=1e-8, every=3)
+    s = ProximalDescent(pb, stop=rule, i_max=1e5, t_max=100)
+    s.fit(pb)
+    assert s.stop_reason == 'cost'
+    assert s.iteration % 3 == 0
+
+
+def test_not_implemented(make_lasso):
+    class Rule(StoppingRule):
+        pass
+
+    pb = make_lasso()
+    s = ProximalDescent(pb, stop=Rule(1e-3), i_max=10)
+    with pytest.raises(ImplementationError):
+        s.fit(pb)
+
+
+def test_get_stopping():
+    assert get_stopping('none', 1) == []
+    rule, = get_stopping('', 1e-3)
+    assert isinstance(rule, StepNorm) and not rule.relative
+    cost = CostDecrease(every=3)
+    rules = get_stopping(['step', cost], 1e-3)
+    assert rules[1] is cost and rules[0].tol == 1e-3
+
+
+def test_gap_needs_dual():
+    class Quadratic(_Problem):
+        def grad(self, pt=None, out=None):
+            return self.pt if pt is None else pt
+
+    with pytest.raises(ValueError):
+        _GradientDescent(Quadratic(size=3), stop='gap')
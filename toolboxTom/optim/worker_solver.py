@@ -1,18 +1,22 @@
+import os
+import logging
 import numpy as np
 from multiprocessing import Process
 
-from .solver import Solver
+from .solver import Solver, log as solver_log
 from toolboxTom.logger import Logger
 log = Logger('WorkerSolver', 20)
 
 
 class WorkerSolver(Process):
     def __init__(self, qin, qout, id_w=0, seed=None, debug=0,
-                 **param):
+                 collector=None, checkpoint_dir=None, **param):
         self.qin = qin
         self.qout = qout
         self.id = id_w
         self.seed = seed
+        self.collector = collector
+        self.checkpoint_dir = checkpoint_dir
         if debug:
             log.set_level(10)
             debug -= 1
@@ -20,16 +24,28 @@ class WorkerSolver(Process):
         super(WorkerSolver, self).__init__()
 
     def run(self):
+        Logger.attach(self.collector, self.id)
+        if self.collector is None:
+            # No handler to report the time of each problem to, only the
+            # warnings start a handler in this worker
+            solver_log.set_level(logging.WARNING)
         seed = self.seed
         if seed is None:
             seed = np.random.randint(214783648)
         np.random.seed(seed)
-        idp, pb = self.qin.get()
+        idp, pb, warm = self.qin.get()
         while idp is not None:
             log.debug('Worker {} - |qin| = {}'
                       ''.format(self.id, self.qin.qsize()))
-            solution = self.solver.solve(pb, name='Sig_{}'.format(idp))
+            name = 'Sig_{}'.format(idp)
+            checkpoint = None
+            if self.checkpoint_dir is not None:
+                checkpoint = os.path.join(self.checkpoint_dir,
+                                          name + '.npz')
+            x0 = pb.pt if warm else None
+            solution = self.solver.solve(pb, x0=x0, name=name,
+                                         checkpoint=checkpoint)
             self.qout.put((idp, solution, pb.cost(solution)))
-            idp, pb = self.qin.get()
+            idp, pb, warm = self.qin.get()
         log.debug('Worker {} finished'.format(self.id))
         return 0